@@ -19,11 +19,19 @@
 # (c) 2009, At Mind B.V. - Jeroen Bakker
 # (c) 2014, Blender Foundation - Campbell Barton
 
+import array
+import bisect
+import contextlib
 import gzip
+import io
 import logging
+import mmap
 import os
+import shutil
 import struct
+import sys
 import tempfile
+import threading
 
 log = logging.getLogger("blendfile")
 
@@ -34,6 +42,23 @@ class BlendFileError(Exception):
     """Raised when there was an error reading/parsing a blend file."""
 
 
+# Files written by the same Blender build have an identical DNA1 block,
+# so share the decoded structs between them (see BlendFile.decode_structs_cached).
+# {(dna1_hash, endian_index, pointer_size): (structs, sdna_index_from_id)}
+_dna_catalog_cache = {}
+# held while reading, decoding & adding catalogs (files may be opened by many threads).
+_dna_catalog_cache_lock = threading.Lock()
+DNA_CATALOG_CACHE_SIZE = 16
+
+# Limits for BlendFilePool (estimated memory, see BlendFilePool.memory_estimate).
+BLENDFILE_POOL_MEMORY_MAX = 256 * 1024 * 1024
+BLENDFILE_POOL_FILES_MAX = 64
+
+# Decompressed data kept by BlendFileStream (for each file).
+STREAM_CHUNK_SIZE = 256 * 1024
+STREAM_CACHE_SIZE = 32 * 1024 * 1024
+
+
 # -----------------------------------------------------------------------------
 # module global routines
 #
@@ -41,10 +66,19 @@ class BlendFileError(Exception):
 # open a filename
 # determine if the file is compressed
 # and returns a handle
-def open_blend(filename, access="rb"):
+def open_blend(filename, access="rb", use_mmap=True, codes=None):
     """Opens a blend file for reading or writing pending on the access
     supports 2 kind of blend files. Uncompressed and compressed.
     Known issue: does not support packaged blend files
+
+    When ``use_mmap`` is set, uncompressed files opened read-only are memory-mapped,
+    so fields are decoded directly from the mapped buffer instead of seeking & reading the file.
+    Compressed files opened read-only are decompressed while reading (see :class:`BlendFileStream`),
+    otherwise they're decompressed into a temporary file.
+
+    When ``codes`` is set (a set of block codes, ``{b'OB', b'ME', ...}``),
+    only blocks using these codes are indexed on load (see :attr:`BlendFile.code_index`),
+    other blocks are read once they're accessed via :meth:`BlendFile.find_block_from_offset`.
     """
     handle = open(filename, access)
     magic_test = b"BLENDER"
@@ -52,27 +86,33 @@ def open_blend(filename, access="rb"):
     if magic == magic_test:
         log.debug("normal blendfile detected")
         handle.seek(0, os.SEEK_SET)
-        bfile = BlendFile(handle)
+        bfile = BlendFile(handle, use_mmap=(use_mmap and access == "rb"), codes=codes)
         bfile.is_compressed = False
         bfile.filepath_orig = filename
         return bfile
     elif magic[:2] == b'\x1f\x8b':
         log.debug("gzip blendfile detected")
         handle.close()
-        log.debug("decompressing started")
         fs = gzip.open(filename, "rb")
-        data = fs.read(FILE_BUFFER_SIZE)
-        magic = data[:len(magic_test)]
+        magic = fs.read(len(magic_test))
         if magic == magic_test:
-            handle = tempfile.TemporaryFile()
-            while data:
-                handle.write(data)
+            fs.seek(0, os.SEEK_SET)
+            if access == "rb":
+                # read-only, decompress while reading (never write the decompressed file to disk).
+                log.debug("streaming decompressed data")
+                bfile = BlendFile(BlendFileStream(fs), codes=codes)
+            else:
+                log.debug("decompressing started")
+                handle = tempfile.TemporaryFile()
                 data = fs.read(FILE_BUFFER_SIZE)
-            log.debug("decompressing finished")
-            fs.close()
-            log.debug("resetting decompressed file")
-            handle.seek(os.SEEK_SET, 0)
-            bfile = BlendFile(handle)
+                while data:
+                    handle.write(data)
+                    data = fs.read(FILE_BUFFER_SIZE)
+                log.debug("decompressing finished")
+                fs.close()
+                log.debug("resetting decompressed file")
+                handle.seek(os.SEEK_SET, 0)
+                bfile = BlendFile(handle, codes=codes)
             bfile.is_compressed = True
             bfile.filepath_orig = filename
             return bfile
@@ -82,6 +122,149 @@ def open_blend(filename, access="rb"):
         raise BlendFileError("filetype not a blend or a gzip blend")
 
 
+class BlendFilePool:
+    """
+    Blend files kept open to be reused while they're unchanged on disk,
+    so visiting the same file many times only reads it once.
+
+    Files are keyed by (path, mtime, size), once the limits are reached
+    the least recently used files are closed.
+
+    Use :meth:`open` instead of :func:`open_blend`, files are closed by the pool
+    (when it's closed, or when a file is modified).
+    """
+    __slots__ = (
+        # collections.OrderedDict {key: [BlendFile, users, BlendFileEdits or None]}
+        # (least recently used first)
+        "files",
+        # int (bytes, see 'memory_estimate')
+        "memory_max",
+        # int
+        "files_max",
+        # threading.Lock
+        "lock",
+        )
+
+    def __init__(self, memory_max=BLENDFILE_POOL_MEMORY_MAX, files_max=BLENDFILE_POOL_FILES_MAX):
+        import collections
+        self.files = collections.OrderedDict()
+        self.memory_max = memory_max
+        self.files_max = files_max
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    @contextlib.contextmanager
+    def open(self, filepath, access="rb", codes=None, edits=None):
+        """
+        Context manager, same arguments as :func:`open_blend`.
+
+        When ``edits`` is set (a :class:`BlendFileEdits`), changes made while the file is open
+        are recorded there, so files opened read-only can be edited.
+        A file is only shared by users of the same ``edits``,
+        otherwise a file which isn't kept in the pool is opened.
+        """
+        st = os.stat(filepath)
+        key = (filepath, access, None if codes is None else frozenset(codes), st.st_mtime_ns, st.st_size)
+
+        with self.lock:
+            item = self.files.get(key)
+            is_shared = (item is None) or self._acquire(key, item, edits)
+            if not is_shared:
+                item = None
+        if item is None:
+            log.debug("pool opening %r" % filepath)
+            bfile = open_blend(filepath, access, codes=codes)
+            with self.lock:
+                item_pool = self.files.get(key) if is_shared else None
+                if (item_pool is not None) and self._acquire(key, item_pool, edits):
+                    # opened by another thread meanwhile
+                    item = item_pool
+                else:
+                    item = [bfile, 0, None]
+                    if is_shared and (item_pool is None):
+                        self.files[key] = item
+                    self._acquire(key, item, edits)
+                    bfile = None
+            if bfile is not None:
+                bfile.close()
+        else:
+            log.debug("pool reusing %r" % filepath)
+
+        try:
+            yield item[0]
+        finally:
+            with self.lock:
+                item[1] -= 1
+                if item[1] == 0:
+                    item[0].edits = item[2] = None
+                    if self.files.get(key) is not item:
+                        # not kept in the pool
+                        item[0].close()
+                    elif item[0].is_modified:
+                        # modified files don't match their key anymore (and may need writing).
+                        del self.files[key]
+                        item[0].close()
+                self.trim()
+
+    def _acquire(self, key, item, edits):
+        """
+        Add a user to ``item`` (with the lock held), returns False when it's in use with other ``edits``.
+        """
+        if (item[1] != 0) and (item[2] is not edits):
+            return False
+        if self.files.get(key) is item:
+            self.files.move_to_end(key)
+        item[0].edits = item[2] = edits
+        item[1] += 1
+        return True
+
+    def trim(self):
+        """
+        Close the least recently used files (which aren't in use) until the pool is within its limits.
+        """
+        memory = sum(BlendFilePool.memory_estimate(item[0]) for item in self.files.values())
+        for key, item in list(self.files.items()):
+            if (len(self.files) <= self.files_max) and (memory <= self.memory_max):
+                break
+            if item[1] == 0:
+                memory -= BlendFilePool.memory_estimate(item[0])
+                del self.files[key]
+                item[0].close()
+
+    def close(self):
+        with self.lock:
+            files = list(self.files.values())
+            self.files.clear()
+        for bfile, users, edits in files:
+            bfile.close()
+
+    @staticmethod
+    def memory_estimate(bfile):
+        """
+        Return the memory used by a blend file in bytes (approximate),
+        not including memory-mapped data.
+        """
+        blocks = bfile.blocks
+        memory = sum(
+            len(values) * values.itemsize
+            for values in (
+                blocks.code_ids, blocks.sizes, blocks.addrs_old,
+                blocks.sdna_indices, blocks.counts, blocks.file_offsets,
+                ))
+        # BlendFileBlock instances & their dict item
+        memory += len(blocks.blocks_used) * 256
+        # dict items & tuples of blocks
+        memory += sum(128 + 8 * len(sub_blocks) for sub_blocks in bfile.id_expand_cache.values())
+        if type(bfile.handle) is BlendFileStream:
+            memory += bfile.handle.memory_estimate()
+        return memory
+
+
 def pad_up_4(offset):
     return (offset + 3) & ~3
 
@@ -97,60 +280,94 @@ class BlendFile:
     __slots__ = (
         # file (result of open())
         "handle",
+        # mmap.mmap or None
+        "handle_mmap",
+        # memoryview of 'handle_mmap' or None (when reading from 'handle')
+        "data",
+        # int or None, file descriptor of 'handle' for positional reads (os.pread)
+        "handle_fd",
+        # threading.RLock, held while seeking & reading/writing 'handle'
+        "handle_lock",
         # str (original name of the file path)
         "filepath_orig",
         # BlendFileHeader
         "header",
         # struct.Struct
         "block_header_struct",
-        # BlendFileBlock
+        # BlendFileBlockTable (sequence of BlendFileBlock)
         "blocks",
         # [DNAStruct, ...]
         "structs",
         # dict {b'StructName': sdna_index}
         # (where the index is an index into 'structs')
         "sdna_index_from_id",
-        # dict {addr_old: block}
+        # dict {addr_old: block_index} or None (until first used)
+        # (negative for blocks not yet read, see BlendFileBlockTable.lazy_resolve)
         "block_from_offset",
-        # int
+        # dict {code: array of block_index}
+        # (only blocks using the 'codes' passed to open_blend)
         "code_index",
+        # dict {(code, id_name): [block_index, ...]} or None (until first used)
+        # (only blocks in 'code_index')
+        "block_from_id_name",
+        # dict {addr_old: (block, ...)}
+        # ID blocks used by each ID block (see blendfile_path_walker.ExpandID.expand)
+        "id_expand_cache",
+        # BlendFileEdits or None, changes are recorded here instead of writing 'handle'
+        # (see BlendFilePool.open)
+        "edits",
         # bool (did we make a change)
         "is_modified",
         # bool (is file gzipped)
         "is_compressed",
         )
 
-    def __init__(self, handle):
+    def __init__(self, handle, use_mmap=False, codes=None):
         log.debug("initializing reading blend-file")
         self.handle = handle
+        self.handle_mmap = None
+        self.data = None
+        if use_mmap:
+            try:
+                self.handle_mmap = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError) as ex:
+                # special files, empty files... read from the handle instead.
+                log.debug("memory mapping failed, using file handle (%s)" % ex)
+            else:
+                self.data = memoryview(self.handle_mmap)
+        self.handle_fd = None
+        self.handle_lock = threading.RLock()
+        if (self.data is None) and hasattr(os, "pread") and (type(handle) is not BlendFileStream):
+            try:
+                self.handle_fd = handle.fileno()
+            except (AttributeError, OSError, io.UnsupportedOperation):
+                pass
         self.header = BlendFileHeader(handle)
         self.block_header_struct = self.header.create_block_header_struct()
-        self.blocks = []
-        self.code_index = {}
         self.structs = []
         self.sdna_index_from_id = {}
 
-        block = BlendFileBlock(handle, self)
-        while block.code != b'ENDB':
-            if block.code == b'DNA1':
-                (self.structs,
-                 self.sdna_index_from_id,
-                 ) = BlendFile.decode_structs(self.header, block, handle)
-            else:
-                handle.seek(block.size, os.SEEK_CUR)
-
-            self.blocks.append(block)
-            self.code_index.setdefault(block.code, []).append(block)
-
-            block = BlendFileBlock(handle, self)
+        self.blocks = BlendFileBlockTable(self)
+        if type(handle) is BlendFileStream:
+            dna_index = self.blocks.scan(handle, self.data, handle.tell(), handle.blocks_data, codes)
+            handle.blocks_set(self.blocks)
+        else:
+            dna_index = self.blocks.scan(handle, self.data, handle.tell(), None, codes)
         self.is_modified = False
-        self.blocks.append(block)
 
-        if not self.structs:
+        if dna_index is None:
             raise BlendFileError("No DNA1 block in file, this is not a valid .blend file!")
 
-        # cache (could lazy init, incase we never use?)
-        self.block_from_offset = {block.addr_old: block for block in self.blocks if block.code != b'ENDB'}
+        (self.structs,
+         self.sdna_index_from_id,
+         ) = BlendFile.decode_structs_cached(self.header, self.blocks.read_data(handle, self.data, dna_index))
+
+        self.code_index = self.blocks.code_index_create()
+        # created on first use
+        self.block_from_offset = None
+        self.block_from_id_name = None
+        self.id_expand_cache = {}
+        self.edits = None
 
     def __repr__(self):
         return '<%s %r>' % (self.__class__.__qualname__, self.handle)
@@ -161,17 +378,114 @@ class BlendFile:
     def __exit__(self, type, value, traceback):
         self.close()
 
+    def read_at(self, offset, size):
+        """
+        Return ``size`` bytes from ``offset`` in the file,
+        without depending on the position of the handle, so threads may read at once.
+
+        A memoryview is returned when the file is memory-mapped, otherwise bytes.
+        """
+        data = self.data
+        if data is not None:
+            data = data[offset:offset + size]
+        elif self.handle_fd is not None:
+            data = os.pread(self.handle_fd, size, offset)
+        else:
+            with self.handle_lock:
+                self.handle.seek(offset, os.SEEK_SET)
+                data = self.handle.read(size)
+        if self.edits:
+            data = self.edits.apply(offset, data)
+        return data
+
     def find_blocks_from_code(self, code):
         assert(type(code) == bytes)
-        if code not in self.code_index:
+        block_indices = self.code_index.get(code)
+        if block_indices is None:
             return []
-        return self.code_index[code]
+        blocks = self.blocks
+        return [blocks[i] for i in block_indices]
 
     def find_block_from_offset(self, offset):
         # same as looking looping over all blocks,
         # then checking ``block.addr_old == offset``
         assert(type(offset) is int)
-        return self.block_from_offset.get(offset)
+        block_from_offset = self.block_from_offset
+        if block_from_offset is None:
+            block_from_offset = self.block_from_offset = self.blocks.block_from_offset_create()
+        block_index = block_from_offset.get(offset)
+        if block_index is None:
+            return None
+        if block_index < 0:
+            block_index = block_from_offset[offset] = self.blocks.lazy_resolve(~block_index)
+        return self.blocks[block_index]
+
+    def find_blocks_from_offsets(self, offsets):
+        """
+        Return a list of blocks for ``offsets`` (any iterable of ints),
+        same as :meth:`find_block_from_offset` for each offset (None when not found).
+        """
+        block_from_offset = self.block_from_offset
+        if block_from_offset is None:
+            block_from_offset = self.block_from_offset = self.blocks.block_from_offset_create()
+        blocks = self.blocks
+        block_from_offset_get = block_from_offset.get
+        result = []
+        for offset in offsets:
+            block_index = block_from_offset_get(offset)
+            if block_index is None:
+                result.append(None)
+                continue
+            if block_index < 0:
+                block_index = block_from_offset[offset] = blocks.lazy_resolve(~block_index)
+            result.append(blocks[block_index])
+        return result
+
+    def find_blocks_from_id_name(self, id_name, code=None):
+        """
+        Return the ID blocks named ``id_name`` (including the ID code, ``b'OBCube'``),
+        in the order they're stored in the file.
+
+        :arg code: The block code, by default the ID code from ``id_name``
+           (use ``b'ID'`` for linked ID's which haven't been read from their library,
+           note that screens use ``b'SN'``).
+        """
+        if code is None:
+            code = id_name[:2]
+        block_from_id_name = self.block_from_id_name
+        if block_from_id_name is None:
+            block_from_id_name = self.block_from_id_name = self.block_from_id_name_create()
+        blocks = self.blocks
+        return [blocks[i] for i in block_from_id_name.get((code, id_name), ())]
+
+    def find_block_from_id_name(self, id_name, code=None):
+        """
+        Same as :meth:`find_blocks_from_id_name`, returning the first block or None.
+        """
+        blocks = self.find_blocks_from_id_name(id_name, code)
+        return blocks[0] if blocks else None
+
+    def block_from_id_name_create(self):
+        """
+        Return {(code, id_name): [block_index, ...]}, for all ID blocks.
+        """
+        header = self.header
+        structs = self.structs
+        sdna_indices = self.blocks.sdna_indices
+        file_offsets = self.blocks.file_offsets
+        block_from_id_name = {}
+        for code, block_indices in self.code_index.items():
+            if len(code) != 2:
+                continue
+            path = b'name' if code == b'ID' else (b'id', b'name')
+            for i in block_indices:
+                id_name = structs[sdna_indices[i]].field_get_from_file(
+                        header, self, file_offsets[i], path,
+                        default=None, use_str=False,
+                        )
+                if id_name is not None:
+                    block_from_id_name.setdefault((code, id_name), []).append(i)
+        return block_from_id_name
 
     def close(self):
         """
@@ -193,8 +507,36 @@ class BlendFile:
                 fs.close()
                 log.debug("compressing finished")
 
+        if self.handle_mmap is not None:
+            self.data.release()
+            self.data = None
+            try:
+                self.handle_mmap.close()
+            except BufferError:
+                # Slices returned by 'BlendFileBlock.get_raw_data' are still in use,
+                # the mapping is freed once they are.
+                log.debug("memory map still in use, not closing")
+            self.handle_mmap = None
+
         handle.close()
 
+    def pointer_graph(self):
+        """
+        Return a :class:`BlendFilePointerGraph` of the references between all blocks in this file.
+
+        Note that blocks skipped when opening the file (see ``codes`` of :func:`open_blend`) are read.
+        """
+        return BlendFilePointerGraph(self)
+
+    def get_data_hashes(self, blocks=None):
+        """
+        Return a list of :meth:`BlendFileBlock.get_data_hash` values for ``blocks``
+        (all blocks when None).
+        """
+        if blocks is None:
+            blocks = self.blocks
+        return [block.get_data_hash() for block in blocks]
+
     def ensure_subtype_smaller(self, sdna_index_curr, sdna_index_next):
         # never refine to a smaller type
         if (self.structs[sdna_index_curr].size >
@@ -205,7 +547,31 @@ class BlendFile:
                                 self.structs[sdna_index_next].dna_type_id.decode('ascii')))
 
     @staticmethod
-    def decode_structs(header, block, handle):
+    def decode_structs_cached(header, data):
+        """
+        Same as :meth:`decode_structs`,
+        the result is shared with other files using an identical DNA1 block.
+        """
+        import hashlib
+        key = (
+            hashlib.blake2b(data, digest_size=16).digest(),
+            header.endian_index,
+            header.pointer_size,
+            )
+        # decoding is held by the lock too, so the same DNA is only decoded once.
+        with _dna_catalog_cache_lock:
+            catalog = _dna_catalog_cache.get(key)
+            if catalog is None:
+                catalog = BlendFile.decode_structs(header, data)
+                while len(_dna_catalog_cache) >= DNA_CATALOG_CACHE_SIZE:
+                    del _dna_catalog_cache[next(iter(_dna_catalog_cache))]
+                _dna_catalog_cache[key] = catalog
+            else:
+                log.debug("reusing DNA catalog")
+        return catalog
+
+    @staticmethod
+    def decode_structs(header, data):
         """
         DNACatalog is a catalog of all information in the DNA1 file-block
         """
@@ -213,8 +579,6 @@ class BlendFile:
         shortstruct = DNA_IO.USHORT[header.endian_index]
         shortstruct2 = struct.Struct(header.endian_str + b'HH')
         intstruct = DNA_IO.UINT[header.endian_index]
-
-        data = handle.read(block.size)
         types = []
         names = []
 
@@ -289,6 +653,687 @@ class BlendFile:
         return structs, sdna_index_from_id
 
 
+class BlendFileBlockTable:
+    """
+    Headers of all blocks in a blend file, stored in columns (one array per header member).
+
+    Acts as a sequence of BlendFileBlock,
+    these are only created once they're accessed (and reused after that).
+    """
+    __slots__ = (
+        # BlendFile
+        "file",
+        # [bytes, ...] (each unique block code)
+        "codes",
+        # array of indices into 'codes'
+        "code_ids",
+        # arrays of block header members
+        "sizes",
+        "addrs_old",
+        "sdna_indices",
+        "counts",
+        "file_offsets",
+        # dict {block_index: BlendFileBlock}
+        "blocks_used",
+        # int (number of blocks read by 'scan', these are sorted by file offset)
+        "scan_len",
+        # arrays (addr_old and header offset of blocks skipped by 'scan') or None
+        "lazy_addrs_old",
+        "lazy_header_offsets",
+        # dict {lazy_index: block_index} (skipped blocks which have been read since)
+        "lazy_block_indices",
+        )
+
+    def __init__(self, bfile):
+        self.file = bfile
+        self.codes = []
+        self.code_ids = array.array('H')
+        self.sizes = array.array('L')
+        self.addrs_old = array.array('Q')
+        self.sdna_indices = array.array('L')
+        self.counts = array.array('L')
+        self.file_offsets = array.array('Q')
+        self.blocks_used = {}
+        self.scan_len = 0
+        self.lazy_addrs_old = None
+        self.lazy_header_offsets = None
+        self.lazy_block_indices = {}
+
+    def __len__(self):
+        return len(self.code_ids)
+
+    def __getitem__(self, index):
+        if type(index) is slice:
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        block = self.blocks_used.get(index)
+        if block is None:
+            # 'setdefault' so threads creating the same block at once all use the same one.
+            block = self.blocks_used.setdefault(index, BlendFileBlock(
+                    self.file,
+                    self.codes[self.code_ids[index]],
+                    self.sizes[index],
+                    self.addrs_old[index],
+                    self.sdna_indices[index],
+                    self.counts[index],
+                    self.file_offsets[index],
+                    ))
+        return block
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def append(self, code, size, addr_old, sdna_index, count, file_offset):
+        try:
+            code_id = self.codes.index(code)
+        except ValueError:
+            code_id = len(self.codes)
+            self.codes.append(code)
+        self.code_ids.append(code_id)
+        self.sizes.append(size)
+        self.addrs_old.append(addr_old)
+        self.sdna_indices.append(sdna_index)
+        self.counts.append(count)
+        self.file_offsets.append(file_offset)
+
+    def scan(self, handle, data, offset, blocks_data=None, codes=None):
+        """
+        Read all block headers, starting at ``offset``.
+
+        :arg data: The file contents (any buffer) or None to read from ``handle``
+           (using a large buffer, skipping over block data).
+        :arg blocks_data: When passed, a dict to store the data of ``DNA1`` & ID blocks,
+           ``{file_offset: bytes}``. The handle is only read forwards, see :class:`BlendFileStream`.
+        :arg codes: When passed, only blocks using these codes are added,
+           other blocks are skipped, storing their address & header offset so they can be read later,
+           see :meth:`lazy_resolve`.
+        :return: The index of the DNA1 block (or None when not found).
+        """
+        block_header_struct = self.file.block_header_struct
+        header_size = block_header_struct.size
+        header_unpack_from = block_header_struct.unpack_from
+
+        if data is not None:
+            def read(offset, size=header_size):
+                return data, offset
+        else:
+            buf = b''
+            buf_offset = 0
+
+            def read(offset, size=header_size):
+                nonlocal buf, buf_offset
+                buf_end = buf_offset + len(buf)
+                if (offset < buf_offset) or (offset + size > buf_end):
+                    if buf_offset <= offset <= buf_end:
+                        # continue reading where the last read ended (no seeking back).
+                        buf = buf[offset - buf_offset:] + handle.read(max(size, FILE_BUFFER_SIZE))
+                    else:
+                        handle.seek(offset, os.SEEK_SET)
+                        buf = handle.read(max(size, FILE_BUFFER_SIZE))
+                    buf_offset = offset
+                return buf, offset - buf_offset
+
+        # {code_raw: (code, code_id, is_lazy)}, avoid stripping the same codes for every block
+        code_from_raw = {}
+        if codes is not None:
+            self.lazy_addrs_old = array.array('Q')
+            self.lazy_header_offsets = array.array('Q')
+            lazy_addrs_old_append = self.lazy_addrs_old.append
+            lazy_header_offsets_append = self.lazy_header_offsets.append
+        code_ids_append = self.code_ids.append
+        sizes_append = self.sizes.append
+        addrs_old_append = self.addrs_old.append
+        sdna_indices_append = self.sdna_indices.append
+        counts_append = self.counts.append
+        file_offsets_append = self.file_offsets.append
+
+        dna_index = None
+        while True:
+            header_data, header_offset = read(offset)
+            if len(header_data) - header_offset < header_size:
+                print("WARNING! Blend file seems to be badly truncated!")
+                break
+            code, size, addr_old, sdna_index, count = header_unpack_from(header_data, header_offset)
+            code_item = code_from_raw.get(code)
+            if code_item is None:
+                code_strip = code.partition(b'\0')[0]
+                code_item = code_from_raw[code] = (
+                    code_strip,
+                    len(self.codes),
+                    (codes is not None) and (code_strip not in codes) and (code_strip not in {b'DNA1', b'ENDB'}),
+                    )
+                self.codes.append(code_strip)
+            code, code_id, is_lazy = code_item
+            if code == b'ENDB':
+                break
+            if is_lazy:
+                lazy_addrs_old_append(addr_old)
+                lazy_header_offsets_append(offset)
+                offset += header_size + size
+                continue
+            if code == b'DNA1':
+                dna_index = len(self.code_ids)
+
+            offset += header_size
+            code_ids_append(code_id)
+            sizes_append(size)
+            addrs_old_append(addr_old)
+            sdna_indices_append(sdna_index)
+            counts_append(count)
+            file_offsets_append(offset)
+            if (blocks_data is not None) and ((len(code) == 2) or (code == b'DNA1')):
+                block_data, block_offset = read(offset, size)
+                blocks_data[offset] = bytes(block_data[block_offset:block_offset + size])
+            offset += size
+
+        self.scan_len = len(self.code_ids)
+        # always end with an ENDB block
+        self.append(b'ENDB', 0, 0, 0, 0, 0)
+
+        return dna_index
+
+    def read_data(self, handle, data, index):
+        """
+        Return the data of a block as bytes (without using a BlendFileBlock).
+        """
+        offset = self.file_offsets[index]
+        size = self.sizes[index]
+        if data is not None:
+            return bytes(data[offset:offset + size])
+        handle.seek(offset, os.SEEK_SET)
+        return handle.read(size)
+
+    def code_index_create(self):
+        """
+        Return {code: array of block_index}, (without the ENDB block).
+        """
+        code_ids = self.code_ids
+        block_indices = [array.array('L') for i in range(len(self.codes))]
+        for i in range(self.scan_len):
+            block_indices[code_ids[i]].append(i)
+        return {
+            code: block_indices[code_id]
+            for code_id, code in enumerate(self.codes)
+            if block_indices[code_id]
+            }
+
+    def block_from_offset_create(self):
+        """
+        Return {addr_old: block_index}, (without the ENDB block).
+
+        Blocks skipped by :meth:`scan` use negative values: ``~lazy_index``.
+        """
+        block_from_offset = {}
+        if self.lazy_addrs_old is not None:
+            block_from_offset.update(zip(self.lazy_addrs_old, range(-1, -len(self.lazy_addrs_old) - 1, -1)))
+        block_from_offset.update(zip(self.addrs_old[:self.scan_len], range(self.scan_len)))
+        return block_from_offset
+
+    def lazy_resolve(self, lazy_index):
+        """
+        Read the header of a block skipped by :meth:`scan`, return its index.
+        """
+        with self.file.handle_lock:
+            block_index = self.lazy_block_indices.get(lazy_index)
+            if block_index is not None:
+                return block_index
+            block_header_struct = self.file.block_header_struct
+            header_offset = self.lazy_header_offsets[lazy_index]
+            code, size, addr_old, sdna_index, count = block_header_struct.unpack(
+                    self.file.read_at(header_offset, block_header_struct.size))
+            block_index = len(self)
+            self.append(
+                    code.partition(b'\0')[0], size, addr_old, sdna_index, count,
+                    header_offset + block_header_struct.size,
+                    )
+            self.lazy_block_indices[lazy_index] = block_index
+            return block_index
+
+    def index_from_file_offset(self, offset):
+        """
+        Return the index of the block containing ``offset`` (in the file), or -1.
+        """
+        file_offsets = self.file_offsets
+        sizes = self.sizes
+        index = bisect.bisect_right(file_offsets, offset, 0, self.scan_len) - 1
+        if (index != -1) and (offset < file_offsets[index] + sizes[index]):
+            return index
+        if self.lazy_block_indices:
+            index = self.lazy_block_indices.get(bisect.bisect_right(self.lazy_header_offsets, offset) - 1, -1)
+            if (index != -1) and (file_offsets[index] <= offset < file_offsets[index] + sizes[index]):
+                return index
+        return -1
+
+
+class BlendFilePointerGraph:
+    """
+    Blocks referenced by each block in a blend file (compressed sparse rows),
+    found from the pointers of each blocks DNA struct (see :meth:`DNAStruct.pointer_offsets`).
+
+    Blocks are identified by their index in :attr:`BlendFile.blocks`.
+    The links between ID's of the same type (``ID.next``, ``ID.prev``) aren't included.
+    """
+    __slots__ = (
+        # BlendFile
+        "file",
+        # array, references from block 'i' are: indices[indptr[i]:indptr[i + 1]]
+        "indptr",
+        # array of block indices (sorted for each block)
+        "indices",
+        )
+
+    # blocks without DNA data
+    CODES_SKIP = {b'DNA1', b'REND', b'TEST', b'ENDB'}
+
+    def __init__(self, bfile):
+        self.file = bfile
+
+        header = bfile.header
+        pointer_size = header.pointer_size
+        typecode = DNA_IO.POINTER_TYPECODES[pointer_size]
+        use_byteswap = (header.endian_index != DNA_IO.ENDIAN_INDEX_NATIVE)
+        pointer_struct = struct.Struct(header.endian_str + typecode.encode('ascii'))
+        structs = bfile.structs
+        blocks = bfile.blocks
+
+        # all blocks are needed
+        block_from_offset = bfile.block_from_offset
+        if block_from_offset is None:
+            block_from_offset = bfile.block_from_offset = blocks.block_from_offset_create()
+        for offset, block_index in list(block_from_offset.items()):
+            if block_index < 0:
+                block_from_offset[offset] = blocks.lazy_resolve(~block_index)
+        block_from_offset_get = block_from_offset.get
+
+        # pointers which aren't references (ID.next, ID.prev)
+        sdna_index_ID = bfile.sdna_index_from_id.get(b'ID')
+        if sdna_index_ID is not None:
+            struct_ID = structs[sdna_index_ID]
+            offsets_ID_skip = {
+                struct_ID.field_offset_from_path(header, path)[1]
+                for path in (b'next', b'prev')
+                if path in struct_ID.field_from_name
+                }
+        else:
+            offsets_ID_skip = set()
+
+        # {sdna_index: (struct_size, offsets, offsets_index, is_array)}
+        # where 'offsets_index' is None when pointers aren't aligned (otherwise offsets in pointers).
+        struct_offsets = {}
+
+        codes_skip = {i for i, code in enumerate(blocks.codes) if code in BlendFilePointerGraph.CODES_SKIP}
+        code_ids = blocks.code_ids
+        sizes = blocks.sizes
+        sdna_indices = blocks.sdna_indices
+        file_offsets = blocks.file_offsets
+
+        indptr = array.array('Q', [0])
+        indices = array.array('Q')
+        for block_index in range(len(blocks)):
+            if code_ids[block_index] not in codes_skip:
+                sdna_index = sdna_indices[block_index]
+                offsets_info = struct_offsets.get(sdna_index)
+                if offsets_info is None:
+                    dna_struct = structs[sdna_index]
+                    offsets = dna_struct.pointer_offsets(header)
+                    # structs which only hold pointers are also used for arrays of pointers (of any length).
+                    is_array = bool(offsets) and (len(offsets) * pointer_size == dna_struct.size)
+                    if (not is_array) and dna_struct.fields and (dna_struct.fields[0].dna_type.dna_type_id == b'ID'):
+                        offsets = tuple(ofs for ofs in offsets if ofs not in offsets_ID_skip)
+                    if (dna_struct.size % pointer_size == 0) and all(ofs % pointer_size == 0 for ofs in offsets):
+                        offsets_index = [ofs // pointer_size for ofs in offsets]
+                    else:
+                        offsets_index = None
+                    offsets_info = struct_offsets[sdna_index] = (dna_struct.size, offsets, offsets_index, is_array)
+                struct_size, offsets, offsets_index, is_array = offsets_info
+
+                if offsets:
+                    size = sizes[block_index]
+                    data = bfile.read_at(file_offsets[block_index], size)
+                    size = len(data)
+                    if is_array or (offsets_index is not None):
+                        values = array.array(typecode)
+                        values.frombytes(data[:size - (size % pointer_size)])
+                        if use_byteswap:
+                            values.byteswap()
+                        if not is_array:
+                            stride = struct_size // pointer_size
+                            values = [
+                                values[i + j]
+                                for i in range(0, (size // struct_size) * stride, stride)
+                                for j in offsets_index
+                                ]
+                    else:
+                        values = [
+                            pointer_struct.unpack_from(data, i + ofs)[0]
+                            for i in range(0, (size // struct_size) * struct_size, struct_size)
+                            for ofs in offsets
+                            ]
+                    targets = set(map(block_from_offset_get, values))
+                    targets.discard(None)
+                    if targets:
+                        indices.extend(sorted(targets))
+            indptr.append(len(indices))
+
+        self.indptr = indptr
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def targets(self, block_index):
+        """
+        Return the indices of the blocks referenced by a block.
+        """
+        return self.indices[self.indptr[block_index]:self.indptr[block_index + 1]]
+
+    def reachable_indices(self, block_indices):
+        """
+        Return the sorted indices of all blocks reachable from ``block_indices`` (included).
+        """
+        indptr = self.indptr
+        indices = self.indices
+        visited = set(block_indices)
+        stack = list(visited)
+        while stack:
+            block_index = stack.pop()
+            for target in indices[indptr[block_index]:indptr[block_index + 1]]:
+                if target not in visited:
+                    visited.add(target)
+                    stack.append(target)
+        return sorted(visited)
+
+    def reachable(self, blocks):
+        """
+        Return all blocks reachable from ``blocks`` (included, typically ID blocks), in file order.
+        """
+        bfile = self.file
+        block_from_offset = bfile.block_from_offset
+        file_blocks = bfile.blocks
+        block_indices = self.reachable_indices([block_from_offset[block.addr_old] for block in blocks])
+        block_indices.sort(key=file_blocks.file_offsets.__getitem__)
+        return [file_blocks[block_index] for block_index in block_indices]
+
+
+class BlendFileStream:
+    """
+    Read-only file object for a compressed blend file,
+    decompressing while reading instead of writing the decompressed file to disk.
+
+    While scanning the file (see :meth:`BlendFileBlockTable.scan`) the data of ``DNA1`` & ID blocks
+    is kept in memory. Other data is decompressed in chunks of :data:`STREAM_CHUNK_SIZE`,
+    the most recently used chunks are kept (up to ``cache_size`` bytes).
+    Reading a chunk behind the current position of the stream which isn't kept restarts decompression.
+    """
+    __slots__ = (
+        # gzip.GzipFile
+        "handle",
+        # int (offset in the decompressed file)
+        "position",
+        # dict {file_offset: bytes} (DNA1 & ID blocks)
+        "blocks_data",
+        # collections.OrderedDict {chunk_offset: bytes} (least recently used first)
+        "chunks",
+        # int (bytes, the limit for 'chunks')
+        "cache_size",
+        # BlendFileBlockTable or None (until scanned)
+        "blocks",
+        # int (number of times decompression restarted)
+        "rewind_count",
+        )
+
+    def __init__(self, handle, cache_size=STREAM_CACHE_SIZE):
+        import collections
+        self.handle = handle
+        self.position = handle.tell()
+        self.blocks_data = {}
+        self.chunks = collections.OrderedDict()
+        self.cache_size = cache_size
+        self.blocks = None
+        self.rewind_count = 0
+
+    def __repr__(self):
+        return '<%s %r>' % (self.__class__.__qualname__, self.handle)
+
+    def blocks_set(self, blocks):
+        self.blocks = blocks
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.position
+        elif whence == os.SEEK_END:
+            raise io.UnsupportedOperation("can't seek from the end of a compressed stream")
+        self.position = offset
+        return offset
+
+    def tell(self):
+        return self.position
+
+    def read(self, size=-1):
+        offset = self.position
+        blocks = self.blocks
+        data = None
+        if size == 0:
+            data = b''
+        elif (blocks is not None) and (size > 0) and self.blocks_data:
+            index = blocks.index_from_file_offset(offset)
+            if index != -1:
+                block_offset = blocks.file_offsets[index]
+                block_data = self.blocks_data.get(block_offset)
+                if (block_data is not None) and (offset + size <= block_offset + len(block_data)):
+                    data = block_data[offset - block_offset:offset - block_offset + size]
+        if data is None:
+            data = self.read_stream(offset, size)
+        self.position = offset + len(data)
+        return data
+
+    def read_stream(self, offset, size):
+        """
+        Read from the decompressed file (using cached chunks where possible).
+        """
+        chunk_size = STREAM_CHUNK_SIZE
+        offset_end = None if size < 0 else offset + size
+        chunk_offset = offset - (offset % chunk_size)
+        data = []
+        while (offset_end is None) or (chunk_offset < offset_end):
+            chunk = self.read_chunk(chunk_offset)
+            data.append(chunk[max(offset - chunk_offset, 0):None if offset_end is None else offset_end - chunk_offset])
+            if len(chunk) < chunk_size:
+                # end of the file
+                break
+            chunk_offset += chunk_size
+        return data[0] if len(data) == 1 else b''.join(data)
+
+    def read_chunk(self, chunk_offset):
+        chunks = self.chunks
+        chunk = chunks.get(chunk_offset)
+        if chunk is not None:
+            chunks.move_to_end(chunk_offset)
+            return chunk
+
+        chunk_size = STREAM_CHUNK_SIZE
+        handle = self.handle
+        offset_curr = handle.tell()
+        if chunk_offset < offset_curr:
+            log.debug("restarting decompression to read offset %d (at %d)" % (chunk_offset, offset_curr))
+            self.rewind_count += 1
+            handle.seek(chunk_offset, os.SEEK_SET)
+            offset_curr = chunk_offset
+        # keep the chunks skipped over, since they're decompressed anyway.
+        while True:
+            chunk = handle.read(chunk_size)
+            chunks[offset_curr] = chunk
+            while (len(chunks) > 1) and (len(chunks) * chunk_size > self.cache_size):
+                chunks.popitem(last=False)
+            if (offset_curr == chunk_offset) or (len(chunk) < chunk_size):
+                break
+            offset_curr += chunk_size
+        return chunk
+
+    def memory_estimate(self):
+        """
+        Return the memory used for decompressed data in bytes.
+        """
+        return (
+            sum(len(data) for data in self.blocks_data.values()) +
+            sum(len(chunk) for chunk in self.chunks.values())
+            )
+
+    def write(self, data):
+        raise io.UnsupportedOperation("compressed blend file opened read-only")
+
+    def close(self):
+        self.blocks_data.clear()
+        self.chunks.clear()
+        self.blocks = None
+        self.handle.close()
+
+
+class BlendFileEdits:
+    """
+    Changes to a blend file kept in memory (copy-on-write),
+    so a file opened read-only can be edited without copying it first.
+
+    Reads from the file see the changes (see :meth:`BlendFile.read_at`),
+    :meth:`copy_file` writes the changed file to its final destination.
+
+    Also a file object for writing (seek, tell & write), used by :meth:`BlendFileBlock.set`.
+    """
+    __slots__ = (
+        # sorted list of offsets (keys of 'ranges')
+        "offsets",
+        # dict {offset: bytearray}, changed ranges (never overlapping or touching)
+        "ranges",
+        # int (offset used by 'write')
+        "position",
+        )
+
+    def __init__(self, items=()):
+        self.offsets = []
+        self.ranges = {}
+        self.position = 0
+        for offset, data in items:
+            self.add(offset, data)
+
+    def __repr__(self):
+        return '<%s %d ranges>' % (self.__class__.__qualname__, len(self.offsets))
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def items(self):
+        """
+        Return [(offset, bytes), ...] for each changed range (in file order).
+        """
+        ranges = self.ranges
+        return [(offset, bytes(ranges[offset])) for offset in self.offsets]
+
+    def add(self, offset, data):
+        """
+        Write ``data`` at ``offset``, over previous changes.
+        """
+        offsets = self.offsets
+        ranges = self.ranges
+        end = offset + len(data)
+
+        # ranges overlapping or touching the new data are merged into one.
+        i = bisect.bisect_left(offsets, offset)
+        if i != 0 and offsets[i - 1] + len(ranges[offsets[i - 1]]) >= offset:
+            i -= 1
+        j = i
+        while j != len(offsets) and offsets[j] <= end:
+            j += 1
+
+        if i == j:
+            offsets.insert(i, offset)
+            ranges[offset] = bytearray(data)
+            return
+
+        start = min(offset, offsets[i])
+        end = max(end, offsets[j - 1] + len(ranges[offsets[j - 1]]))
+        merged = bytearray(end - start)
+        for offset_range in offsets[i:j]:
+            data_range = ranges.pop(offset_range)
+            merged[offset_range - start:offset_range - start + len(data_range)] = data_range
+        merged[offset - start:offset - start + len(data)] = data
+        offsets[i:j] = [start]
+        ranges[start] = merged
+
+    def apply(self, offset, data):
+        """
+        Return ``data`` (read from ``offset`` in the unchanged file) with the changes applied.
+        """
+        offsets = self.offsets
+        end = offset + len(data)
+        i = max(bisect.bisect_right(offsets, offset) - 1, 0)
+        result = None
+        while i != len(offsets) and offsets[i] < end:
+            offset_range = offsets[i]
+            data_range = self.ranges[offset_range]
+            lo = max(offset_range, offset)
+            hi = min(offset_range + len(data_range), end)
+            if lo < hi:
+                if result is None:
+                    result = bytearray(data)
+                result[lo - offset:hi - offset] = data_range[lo - offset_range:hi - offset_range]
+            i += 1
+        return data if result is None else bytes(result)
+
+    # file object for writing
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.position
+        elif whence == os.SEEK_END:
+            raise io.UnsupportedOperation("can't seek from the end of blend file edits")
+        self.position = offset
+        return offset
+
+    def tell(self):
+        return self.position
+
+    def write(self, data):
+        self.add(self.position, data)
+        self.position += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def copy_file(self, filepath_src, handle_dst, chunk_size=FILE_BUFFER_SIZE):
+        """
+        Write the blend file ``filepath_src`` with the changes applied to ``handle_dst``
+        (any object with a ``write`` method), reading and writing it once.
+
+        Compressed files are written compressed (unchanged files are copied as-is).
+        """
+        with open(filepath_src, "rb") as handle_src:
+            if not self.offsets:
+                shutil.copyfileobj(handle_src, handle_dst, chunk_size)
+                return
+
+            is_compressed = (handle_src.read(2) == b'\x1f\x8b')
+            handle_src.seek(0, os.SEEK_SET)
+            if is_compressed:
+                # no file name or time, so the result only depends on the data.
+                with gzip.GzipFile(fileobj=handle_src, mode="rb") as fs_src, \
+                     gzip.GzipFile(filename="", fileobj=handle_dst, mode="wb", mtime=0) as fs_dst:
+                    self._copy_stream(fs_src, fs_dst, chunk_size)
+            else:
+                self._copy_stream(handle_src, handle_dst, chunk_size)
+
+    def _copy_stream(self, handle_src, handle_dst, chunk_size):
+        offset = 0
+        while True:
+            data = handle_src.read(chunk_size)
+            if not data:
+                break
+            handle_dst.write(self.apply(offset, data))
+            offset += len(data)
+
+
 class BlendFileBlock:
     """
     Instance of a struct.
@@ -316,51 +1361,16 @@ class BlendFileBlock:
                  hex(self.addr_old),
                  ))
 
-    def __init__(self, handle, bfile):
-        OLDBLOCK = struct.Struct(b'4sI')
-
+    def __init__(self, bfile, code, size, addr_old, sdna_index, count, file_offset):
         self.file = bfile
         self.user_data = None
 
-        data = handle.read(bfile.block_header_struct.size)
-
-        if len(data) != bfile.block_header_struct.size:
-            print("WARNING! Blend file seems to be badly truncated!")
-            self.code = b'ENDB'
-            self.size = 0
-            self.addr_old = 0
-            self.sdna_index = 0
-            self.count = 0
-            self.file_offset = 0
-            return
-        # header size can be 8, 20, or 24 bytes long
-        # 8: old blend files ENDB block (exception)
-        # 20: normal headers 32 bit platform
-        # 24: normal headers 64 bit platform
-        if len(data) > 15:
-            blockheader = bfile.block_header_struct.unpack(data)
-            self.code = blockheader[0].partition(b'\0')[0]
-            if self.code != b'ENDB':
-                self.size = blockheader[1]
-                self.addr_old = blockheader[2]
-                self.sdna_index = blockheader[3]
-                self.count = blockheader[4]
-                self.file_offset = handle.tell()
-            else:
-                self.size = 0
-                self.addr_old = 0
-                self.sdna_index = 0
-                self.count = 0
-                self.file_offset = 0
-        else:
-            blockheader = OLDBLOCK.unpack(data)
-            self.code = blockheader[0].partition(b'\0')[0]
-            self.code = DNA_IO.read_data0(blockheader[0])
-            self.size = 0
-            self.addr_old = 0
-            self.sdna_index = 0
-            self.count = 0
-            self.file_offset = 0
+        self.code = code
+        self.size = size
+        self.addr_old = addr_old
+        self.sdna_index = sdna_index
+        self.count = count
+        self.file_offset = file_offset
 
     @property
     def dna_type(self):
@@ -394,7 +1404,6 @@ class BlendFileBlock:
         if base_index != 0:
             assert(base_index < self.count)
             ofs += (self.size // self.count) * base_index
-        self.file.handle.seek(ofs, os.SEEK_SET)
 
         if sdna_index_refine is None:
             sdna_index_refine = self.sdna_index
@@ -402,10 +1411,10 @@ class BlendFileBlock:
             self.file.ensure_subtype_smaller(self.sdna_index, sdna_index_refine)
 
         dna_struct = self.file.structs[sdna_index_refine]
-        field = dna_struct.field_from_path(
-                self.file.header, self.file.handle, path)
+        field, field_offset = dna_struct.field_offset_from_path(
+                self.file.header, path)
 
-        return (self.file.handle.tell(), field.dna_name.array_size)
+        return (ofs + field_offset, field.dna_name.array_size)
 
     def get(self, path,
             default=...,
@@ -418,7 +1427,6 @@ class BlendFileBlock:
         if base_index != 0:
             assert(base_index < self.count)
             ofs += (self.size // self.count) * base_index
-        self.file.handle.seek(ofs, os.SEEK_SET)
 
         if sdna_index_refine is None:
             sdna_index_refine = self.sdna_index
@@ -426,12 +1434,90 @@ class BlendFileBlock:
             self.file.ensure_subtype_smaller(self.sdna_index, sdna_index_refine)
 
         dna_struct = self.file.structs[sdna_index_refine]
-        return dna_struct.field_get(
-                self.file.header, self.file.handle, path,
+        data = self.file.data
+        if data is not None and not self.file.edits:
+            return dna_struct.field_get_from_buffer(
+                    self.file.header, data, ofs, path,
+                    default=default,
+                    use_nil=use_nil, use_str=use_str,
+                    )
+
+        return dna_struct.field_get_from_file(
+                self.file.header, self.file, ofs, path,
                 default=default,
                 use_nil=use_nil, use_str=use_str,
                 )
 
+    def get_raw_data(self):
+        """
+        Return the data of this block,
+        a memoryview into the file when it's memory-mapped, otherwise bytes.
+        """
+        return self.file.read_at(self.file_offset, self.size)
+
+    def get_array(self, path,
+                  default=...,
+                  sdna_index_refine=None,
+                  use_nil=True, use_str=True,
+                  ):
+        """
+        Return a list of the values of ``path`` for all elements of this block,
+        same as calling :meth:`get` for each ``base_index``, reading the block data once.
+        """
+        if sdna_index_refine is None:
+            sdna_index_refine = self.sdna_index
+        else:
+            self.file.ensure_subtype_smaller(self.sdna_index, sdna_index_refine)
+
+        dna_struct = self.file.structs[sdna_index_refine]
+        accessor = dna_struct.field_accessor_from_path(self.file.header, path)
+        if accessor is None:
+            if default is not ...:
+                return [default] * self.count
+            else:
+                raise KeyError("%r not found in %r (%r)" %
+                        (path, [f.dna_name.name_only for f in dna_struct.fields], dna_struct.dna_type_id))
+
+        data = self.get_raw_data()
+        stride = self.size // self.count
+        unpack_from = accessor.unpack_from
+        return [
+            unpack_from(data, ofs, use_nil=use_nil, use_str=use_str)
+            for ofs in range(accessor.offset, stride * self.count, stride)
+            ]
+
+    def get_pointer_array(self, length=-1):
+        """
+        Return the block data as an array of pointers (for blocks storing a C array of pointers),
+        ``length`` limits the number of pointers read.
+        """
+        header = self.file.header
+        values = array.array(DNA_IO.POINTER_TYPECODES[header.pointer_size])
+        data = self.get_raw_data()
+        if length != -1:
+            data = data[:length * header.pointer_size]
+        values.frombytes(data[:len(data) - (len(data) % header.pointer_size)])
+        if header.endian_index != DNA_IO.ENDIAN_INDEX_NATIVE:
+            values.byteswap()
+        return values
+
+    def as_numpy(self, sdna_index_refine=None):
+        """
+        Return the block data as a NumPy structured array (one item for each element),
+        using the layout of the blocks DNA struct (see :meth:`DNAStruct.numpy_dtype`).
+
+        Requires NumPy.
+        """
+        import numpy
+
+        if sdna_index_refine is None:
+            sdna_index_refine = self.sdna_index
+        else:
+            self.file.ensure_subtype_smaller(self.sdna_index, sdna_index_refine)
+
+        dtype = self.file.structs[sdna_index_refine].numpy_dtype(self.file.header)
+        return numpy.frombuffer(self.get_raw_data(), dtype=dtype, count=self.size // dtype.itemsize)
+
     def get_recursive_iter(self, path, path_root=b"",
                            default=...,
                            sdna_index_refine=None,
@@ -459,6 +1545,13 @@ class BlendFileBlock:
                             f.dna_name.name_only, path_full, default, None, use_nil, use_str, 0)
 
     def items_recursive_iter(self):
+        decoder = self.dna_type.items_decoder(self.file, recursive=True)
+        data = self.file.read_at(self.file_offset, decoder.size)
+        if len(data) == decoder.size:
+            yield from decoder.unpack_from(data, 0)
+            return
+
+        # truncated file
         for k in self.keys():
             yield from self.get_recursive_iter(k, use_str=False)
 
@@ -466,19 +1559,24 @@ class BlendFileBlock:
         """
         Generates a 'hash' that can be used instead of addr_old as block id, and that should be 'stable' across .blend
         file load & save (i.e. it does not changes due to pointer addresses variations).
+
+        The raw block data is hashed (blake2b) with all pointers masked out, see :meth:`DNAStruct.pointer_mask`.
+        Blocks without a DNA struct (raw data such as arrays, ``DNA1``, ``TEST`` ...) are hashed as-is.
         """
-        # TODO This implementation is most likely far from optimal... and CRC32 is not renown as the best hashing
-        #      algo either. But for now does the job!
-        import zlib
-        def _is_pointer(self, k):
-            return self.file.structs[self.sdna_index].field_from_path(
-                    self.file.header, self.file.handle, k).dna_name.is_pointer
+        import hashlib
 
-        hsh = 1
-        for k, v in self.items_recursive_iter():
-            if not _is_pointer(self, k):
-                hsh = zlib.adler32(str(v).encode(), hsh)
-        return hsh
+        data = self.get_raw_data()
+        # Blender writes data without a struct using the first SDNA index.
+        if self.sdna_index != 0:
+            struct_mask = self.file.structs[self.sdna_index].pointer_mask(self.file.header)
+        else:
+            struct_mask = None
+        if struct_mask:
+            # repeat for each element, bytes past the last whole element are kept as-is.
+            mask = struct_mask * (self.size // len(struct_mask))
+            mask += b'\xff' * (self.size - len(mask))
+            data = (int.from_bytes(data, 'little') & int.from_bytes(mask, 'little')).to_bytes(self.size, 'little')
+        return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
 
     def set(self, path, value,
             sdna_index_refine=None,
@@ -490,10 +1588,20 @@ class BlendFileBlock:
             self.file.ensure_subtype_smaller(self.sdna_index, sdna_index_refine)
 
         dna_struct = self.file.structs[sdna_index_refine]
-        self.file.handle.seek(self.file_offset, os.SEEK_SET)
-        self.file.is_modified = True
-        return dna_struct.field_set(
-                self.file.header, self.file.handle, path, value)
+        edits = self.file.edits
+        if edits is not None:
+            # the file itself is unchanged.
+            edits.seek(self.file_offset, os.SEEK_SET)
+            return dna_struct.field_set(self.file.header, edits, path, value)
+
+        handle = self.file.handle
+        with self.file.handle_lock:
+            handle.seek(self.file_offset, os.SEEK_SET)
+            self.file.is_modified = True
+            result = dna_struct.field_set(self.file.header, handle, path, value)
+            # so positional reads see the change.
+            handle.flush()
+        return result
 
     # ---------------
     # Utility get/set
@@ -513,8 +1621,8 @@ class BlendFileBlock:
         if type(result) is not int:
             return result
 
-        assert(self.file.structs[sdna_index_refine].field_from_path(
-                self.file.header, self.file.handle, path).dna_name.is_pointer)
+        assert(self.file.structs[sdna_index_refine].field_accessor_from_path(
+                self.file.header, path).field.dna_name.is_pointer)
         if result != 0:
             # possible (but unlikely)
             # that this fails and returns None
@@ -537,14 +1645,17 @@ class BlendFileBlock:
         return (f.dna_name.name_only for f in self.dna_type.fields)
 
     def values(self):
-        for k in self.keys():
-            try:
-                yield self[k]
-            except NotImplementedError as ex:
-                msg, dna_name, dna_type = ex.args
-                yield "<%s>" % dna_type.dna_type_id.decode('ascii')
+        for k, v in self.items():
+            yield v
 
     def items(self):
+        decoder = self.dna_type.items_decoder(self.file, recursive=False)
+        data = self.file.read_at(self.file_offset, decoder.size)
+        if len(data) == decoder.size:
+            yield from decoder.unpack_from(data, 0)
+            return
+
+        # truncated file
         for k in self.keys():
             try:
                 yield (k, self[k])
@@ -710,6 +1821,18 @@ class DNAStruct:
         "size",
         "fields",
         "field_from_name",
+        # dict {path: DNAFieldAccessor or None}
+        # (cache for field_accessor_from_path)
+        "field_accessors",
+        # numpy.dtype or None (cache for numpy_dtype)
+        "numpy_dtype_cache",
+        # bytes or None (cache for pointer_mask)
+        "pointer_mask_cache",
+        # tuple or None (cache for pointer_offsets)
+        "pointer_offsets_cache",
+        # dict {recursive: DNAStructItemsDecoder}
+        # (cache for items_decoder)
+        "items_decoders",
         "user_data",
         )
 
@@ -717,101 +1840,254 @@ class DNAStruct:
         self.dna_type_id = dna_type_id
         self.fields = []
         self.field_from_name = {}
+        self.field_accessors = {}
+        self.numpy_dtype_cache = None
+        self.pointer_mask_cache = None
+        self.pointer_offsets_cache = None
+        self.items_decoders = {}
         self.user_data = None
 
     def __repr__(self):
         return '%s(%r)' % (type(self).__qualname__, self.dna_type_id)
 
-    def field_from_path(self, header, handle, path):
+    def field_offset_from_path(self, header, path):
         """
         Support lookups as bytes or a tuple of bytes and optional index.
 
         C style 'id.name'   -->  (b'id', b'name')
         C style 'array[4]'  -->  ('array', 4)
+
+        Return (field, offset), where the offset is relative to the start of this struct,
+        field is None when the path can't be found.
         """
-        if type(path) is tuple:
-            name = path[0]
-            if len(path) >= 2 and type(path[1]) is not bytes:
-                name_tail = path[2:]
-                index = path[1]
-                assert(type(index) is int)
+        dna_struct = self
+        offset = 0
+        while True:
+            if type(path) is tuple:
+                name = path[0]
+                if len(path) >= 2 and type(path[1]) is not bytes:
+                    name_tail = path[2:]
+                    index = path[1]
+                    assert(type(index) is int)
+                else:
+                    name_tail = path[1:]
+                    index = 0
             else:
-                name_tail = path[1:]
+                name = path
+                name_tail = None
                 index = 0
-        else:
-            name = path
-            name_tail = None
-            index = 0
 
-        assert(type(name) is bytes)
+            assert(type(name) is bytes)
 
-        field = self.field_from_name.get(name)
+            field = dna_struct.field_from_name.get(name)
+            if field is None:
+                return None, offset
 
-        if field is not None:
-            handle.seek(field.dna_offset, os.SEEK_CUR)
+            offset += field.dna_offset
             if index != 0:
                 if field.dna_name.is_pointer:
                     index_offset = header.pointer_size * index
                 else:
                     index_offset = field.dna_type.size * index
                 assert(index_offset < field.dna_size)
-                handle.seek(index_offset, os.SEEK_CUR)
+                offset += index_offset
             if not name_tail:  # None or ()
-                return field
+                return field, offset
+
+            dna_struct = field.dna_type
+            path = name_tail
+
+    def field_from_path(self, header, handle, path):
+        """
+        Same as :meth:`field_offset_from_path`,
+        seeks the handle to the field (relative to its current position) and returns the field.
+        """
+        field, offset = self.field_offset_from_path(header, path)
+        handle.seek(offset, os.SEEK_CUR)
+        return field
+
+    def field_accessor_from_path(self, header, path):
+        """
+        Return a DNAFieldAccessor for the path (see :meth:`field_offset_from_path`),
+        or None when the path can't be found.
+
+        Accessors are created once for each path, then reused.
+        """
+        try:
+            return self.field_accessors[path]
+        except KeyError:
+            pass
+
+        field, offset = self.field_offset_from_path(header, path)
+        if field is None:
+            accessor = None
+        else:
+            accessor = DNAFieldAccessor(header, field, offset, path)
+        self.field_accessors[path] = accessor
+        return accessor
+
+    def numpy_dtype(self, header):
+        """
+        Return a NumPy structured dtype with the layout of this struct (requires NumPy).
+
+        Pointers are unsigned integers, char arrays are bytes (not nil terminated),
+        nested structs use their own dtype,
+        other types (double, long... ) are raw bytes.
+        """
+        dtype = self.numpy_dtype_cache
+        if dtype is not None:
+            return dtype
+
+        import numpy
+
+        endian_str = header.endian_str.decode('ascii')
+        names = []
+        formats = []
+        offsets = []
+        for field in self.fields:
+            dna_name = field.dna_name
+            dna_type = field.dna_type
+            name = dna_name.name_only.decode('ascii')
+            if name in names:
+                continue
+            array_size = dna_name.array_size
+            if dna_name.is_pointer:
+                fmt = '%su%d' % (endian_str, header.pointer_size)
+                array_size = field.dna_size // header.pointer_size
+            elif dna_type.dna_type_id in DNA_IO.NUMBER_FORMATS:
+                fmt = endian_str + DNA_IO.NUMBER_FORMATS[dna_type.dna_type_id].decode('ascii')
+            elif dna_type.dna_type_id == b'char':
+                if array_size > 1:
+                    fmt = 'S%d' % array_size
+                    array_size = 1
+                else:
+                    fmt = 'i1'
+            elif dna_type.fields:
+                fmt = dna_type.numpy_dtype(header)
             else:
-                return field.dna_type.field_from_path(header, handle, name_tail)
+                fmt = 'V%d' % dna_type.size
+            names.append(name)
+            formats.append(fmt if array_size == 1 else (fmt, (array_size, )))
+            offsets.append(field.dna_offset)
+
+        dtype = self.numpy_dtype_cache = numpy.dtype({
+            "names": names,
+            "formats": formats,
+            "offsets": offsets,
+            "itemsize": self.size,
+            })
+        return dtype
+
+    def pointer_mask(self, header):
+        """
+        Return a mask the size of this struct, zero bytes for pointers (nested structs included),
+        0xff for all other bytes. An empty mask is returned when the struct has no pointers.
+        """
+        mask = self.pointer_mask_cache
+        if mask is not None:
+            return mask
+
+        mask = bytearray(b'\xff' * self.size)
+        for field in self.fields:
+            if field.dna_name.is_pointer:
+                mask[field.dna_offset:field.dna_offset + field.dna_size] = bytes(field.dna_size)
+            elif field.dna_type.fields:
+                sub_mask = field.dna_type.pointer_mask(header)
+                if sub_mask:
+                    sub_size = len(sub_mask)
+                    for i in range(field.dna_name.array_size):
+                        sub_offset = field.dna_offset + (i * sub_size)
+                        mask[sub_offset:sub_offset + sub_size] = sub_mask
+
+        mask = self.pointer_mask_cache = bytes(mask) if 0 in mask else b''
+        return mask
+
+    def pointer_offsets(self, header):
+        """
+        Return a tuple with the offset of every pointer in this struct (nested structs included).
+        """
+        offsets = self.pointer_offsets_cache
+        if offsets is not None:
+            return offsets
+
+        offsets = []
+        for field in self.fields:
+            if field.dna_name.is_pointer:
+                offsets.extend(range(field.dna_offset, field.dna_offset + field.dna_size, header.pointer_size))
+            elif field.dna_type.fields:
+                sub_offsets = field.dna_type.pointer_offsets(header)
+                if sub_offsets:
+                    sub_size = field.dna_type.size
+                    for i in range(field.dna_name.array_size):
+                        sub_offset = field.dna_offset + (i * sub_size)
+                        offsets.extend(sub_offset + ofs for ofs in sub_offsets)
+
+        offsets = self.pointer_offsets_cache = tuple(offsets)
+        return offsets
+
+    def items_decoder(self, bfile, recursive):
+        """
+        Return a DNAStructItemsDecoder for this struct,
+        created once, then reused (by all files sharing this struct, see :meth:`BlendFile.decode_structs_cached`).
+        """
+        decoder = self.items_decoders.get(recursive)
+        if decoder is None:
+            decoder = self.items_decoders[recursive] = DNAStructItemsDecoder(bfile, self, recursive)
+        return decoder
 
     def field_get(self, header, handle, path,
                   default=...,
                   use_nil=True, use_str=True,
                   ):
-        field = self.field_from_path(header, handle, path)
-        if field is None:
+        accessor = self.field_accessor_from_path(header, path)
+        if accessor is None:
             if default is not ...:
                 return default
             else:
                 raise KeyError("%r not found in %r (%r)" %
                         (path, [f.dna_name.name_only for f in self.fields], self.dna_type_id))
 
-        dna_type = field.dna_type
-        dna_name = field.dna_name
-        dna_size = field.dna_size
+        handle.seek(accessor.offset, os.SEEK_CUR)
+        return accessor.unpack_from(handle.read(accessor.size), 0, use_nil=use_nil, use_str=use_str)
 
-        if dna_name.is_pointer:
-            return DNA_IO.read_pointer(handle, header)
-        elif dna_type.dna_type_id == b'int':
-            if dna_name.array_size > 1:
-                return [DNA_IO.read_int(handle, header) for i in range(dna_name.array_size)]
-            return DNA_IO.read_int(handle, header)
-        elif dna_type.dna_type_id == b'short':
-            if dna_name.array_size > 1:
-                return [DNA_IO.read_short(handle, header) for i in range(dna_name.array_size)]
-            return DNA_IO.read_short(handle, header)
-        elif dna_type.dna_type_id == b'uint64_t':
-            if dna_name.array_size > 1:
-                return [DNA_IO.read_ulong(handle, header) for i in range(dna_name.array_size)]
-            return DNA_IO.read_ulong(handle, header)
-        elif dna_type.dna_type_id == b'float':
-            if dna_name.array_size > 1:
-                return [DNA_IO.read_float(handle, header) for i in range(dna_name.array_size)]
-            return DNA_IO.read_float(handle, header)
-        elif dna_type.dna_type_id == b'char':
-            if dna_size == 1:
-                # Single char, assume it's bitflag or int value, and not a string/bytes data...
-                return DNA_IO.read_char(handle, header)
-            if use_str:
-                if use_nil:
-                    return DNA_IO.read_string0(handle, dna_name.array_size)
-                else:
-                    return DNA_IO.read_string(handle, dna_name.array_size)
+    def field_get_from_file(self, header, bfile, offset, path,
+                            default=...,
+                            use_nil=True, use_str=True,
+                            ):
+        """
+        Same as :meth:`field_get`, reading with :meth:`BlendFile.read_at`
+        where this struct starts at ``offset``.
+        """
+        accessor = self.field_accessor_from_path(header, path)
+        if accessor is None:
+            if default is not ...:
+                return default
             else:
-                if use_nil:
-                    return DNA_IO.read_bytes0(handle, dna_name.array_size)
+                raise KeyError("%r not found in %r (%r)" %
+                        (path, [f.dna_name.name_only for f in self.fields], self.dna_type_id))
+
+        return accessor.unpack_from(
+                bfile.read_at(offset + accessor.offset, accessor.size), 0, use_nil=use_nil, use_str=use_str)
+
+    def field_get_from_buffer(self, header, data, offset, path,
+                              default=...,
+                              use_nil=True, use_str=True,
+                              ):
+        """
+        Same as :meth:`field_get`, reading from ``data`` (any buffer)
+        where this struct starts at ``offset``.
+        """
+        accessor = self.field_accessors.get(path)
+        if accessor is None:
+            accessor = self.field_accessor_from_path(header, path)
+            if accessor is None:
+                if default is not ...:
+                    return default
                 else:
-                    return DNA_IO.read_bytes(handle, dna_name.array_size)
-        else:
-            raise NotImplementedError("%r exists but isn't pointer, can't resolve field %r" %
-                    (path, dna_name.name_only), dna_name, dna_type)
+                    raise KeyError("%r not found in %r (%r)" %
+                            (path, [f.dna_name.name_only for f in self.fields], self.dna_type_id))
+
+        return accessor.unpack_from(data, offset + accessor.offset, use_nil=use_nil, use_str=use_str)
 
     def field_set(self, header, handle, path, value):
         assert(type(path) == bytes)
@@ -834,6 +2110,178 @@ class DNAStruct:
                                       (dna_type, dna_name), dna_name, dna_type)
 
 
+class DNAFieldAccessor:
+    """
+    DNAFieldAccessor reads a value from a field path of a DNAStruct,
+    resolved once into an offset and a prebuilt struct.Struct
+    """
+    __slots__ = (
+        # DNAField
+        "field",
+        # offset from the start of the struct (nested structs & index included)
+        "offset",
+        # number of bytes read
+        "size",
+        # struct.Struct or None (for strings)
+        "struct",
+        # bool, unpack a single value instead of a list
+        "is_single",
+        # str or None, when set the value can't be read (nested structs)
+        "error",
+        )
+
+    def __init__(self, header, field, offset, path):
+        self.field = field
+        self.offset = offset
+        self.struct = None
+        self.is_single = True
+        self.error = None
+
+        dna_type = field.dna_type
+        dna_name = field.dna_name
+
+        if dna_name.is_pointer:
+            self.struct = struct.Struct(header.endian_str + (b'I' if header.pointer_size == 4 else b'Q'))
+        elif dna_type.dna_type_id in DNA_IO.NUMBER_FORMATS:
+            if dna_name.array_size > 1:
+                self.is_single = False
+            self.struct = struct.Struct(b'%s%d%s' % (
+                    header.endian_str, dna_name.array_size, DNA_IO.NUMBER_FORMATS[dna_type.dna_type_id]))
+        elif dna_type.dna_type_id == b'char':
+            if field.dna_size == 1:
+                # Single char, assume it's bitflag or int value, and not a string/bytes data...
+                self.struct = struct.Struct(header.endian_str + b'b')
+        else:
+            self.error = ("%r exists but isn't pointer, can't resolve field %r" %
+                          (path, dna_name.name_only))
+
+        if self.struct is not None:
+            self.size = self.struct.size
+        elif self.error is None:
+            self.size = dna_name.array_size
+        else:
+            self.size = 0
+
+    def unpack_from(self, data, offset,
+                    use_nil=True, use_str=True,
+                    ):
+        st = self.struct
+        if st is not None:
+            if self.is_single:
+                return st.unpack_from(data, offset)[0]
+            return list(st.unpack_from(data, offset))
+        elif self.error is None:
+            value = bytes(data[offset:offset + self.size])
+            if use_nil:
+                value = DNA_IO.read_data0(value)
+            if use_str:
+                value = value.decode('utf-8')
+            return value
+        else:
+            raise NotImplementedError(self.error, self.field.dna_name, self.field.dna_type)
+
+
+class DNAStructItemsDecoder:
+    """
+    DNAStructItemsDecoder reads all fields of a DNAStruct at once,
+    giving the same result as :meth:`BlendFileBlock.items` (or :meth:`BlendFileBlock.items_recursive_iter`
+    when ``recursive`` is set), compiled into a single struct.Struct
+    """
+    __slots__ = (
+        # struct.Struct (all fields which can be read, padding skipped)
+        "struct",
+        # number of bytes read
+        "size",
+        # [(key, kind, arg, count), ...] (see KIND_* below)
+        "items",
+        )
+
+    # value is 'struct' result at index 'arg'
+    KIND_SINGLE = 0
+    # value is a list of 'count' 'struct' results from index 'arg'
+    KIND_LIST = 1
+    # value is a nil terminated 'struct' result at index 'arg'
+    KIND_BYTES = 2
+    # value is 'arg'
+    KIND_CONST = 3
+    # value is read by the DNAFieldAccessor 'arg' (overlapping fields)
+    KIND_ACCESSOR = 4
+
+    def __init__(self, bfile, dna_struct, recursive):
+        header = bfile.header
+        fmt = [header.endian_str]
+        # offset of the next byte to read
+        offset_end = 0
+        # number of values unpacked
+        values_len = 0
+        self.items = []
+
+        # paths to read (last first)
+        paths = [f.dna_name.name_only for f in reversed(dna_struct.fields)]
+        while paths:
+            key = path = paths.pop()
+            accessor = dna_struct.field_accessor_from_path(header, path)
+            if accessor.error is not None:
+                dna_type_id = accessor.field.dna_type.dna_type_id
+                struct_index = bfile.sdna_index_from_id.get(dna_type_id) if recursive else None
+                if struct_index is None:
+                    self.items.append((key, DNAStructItemsDecoder.KIND_CONST, "<%s>" % dna_type_id.decode('ascii'), 0))
+                else:
+                    # depth first, same order as 'BlendFileBlock.get_recursive_iter'
+                    path_root = path if type(path) is tuple else (path, )
+                    for f in reversed(bfile.structs[struct_index].fields):
+                        paths.append(path_root + (f.dna_name.name_only, ))
+                continue
+
+            if accessor.offset < offset_end:
+                self.items.append((key, DNAStructItemsDecoder.KIND_ACCESSOR, accessor, 0))
+                continue
+
+            if accessor.offset != offset_end:
+                fmt.append(b'%dx' % (accessor.offset - offset_end))
+            if accessor.struct is None:
+                fmt.append(b'%ds' % accessor.size)
+                self.items.append((key, DNAStructItemsDecoder.KIND_BYTES, values_len, 0))
+                values_len += 1
+            else:
+                accessor_fmt = accessor.struct.format
+                if type(accessor_fmt) is str:
+                    accessor_fmt = accessor_fmt.encode('ascii')
+                # strip the endian
+                fmt.append(accessor_fmt[1:])
+                if accessor.is_single:
+                    self.items.append((key, DNAStructItemsDecoder.KIND_SINGLE, values_len, 0))
+                    values_len += 1
+                else:
+                    count = accessor.field.dna_name.array_size
+                    self.items.append((key, DNAStructItemsDecoder.KIND_LIST, values_len, count))
+                    values_len += count
+            offset_end = accessor.offset + accessor.size
+
+        self.struct = struct.Struct(b''.join(fmt))
+        self.size = max(self.struct.size, dna_struct.size)
+
+    def unpack_from(self, data, offset):
+        """
+        Return a list of (key, value) pairs.
+        """
+        values = self.struct.unpack_from(data, offset)
+        result = []
+        for key, kind, arg, count in self.items:
+            if kind == DNAStructItemsDecoder.KIND_SINGLE:
+                value = values[arg]
+            elif kind == DNAStructItemsDecoder.KIND_LIST:
+                value = list(values[arg:arg + count])
+            elif kind == DNAStructItemsDecoder.KIND_BYTES:
+                value = DNA_IO.read_data0(values[arg])
+            elif kind == DNAStructItemsDecoder.KIND_CONST:
+                value = arg
+            else:
+                value = arg.unpack_from(data, offset + arg.offset, use_nil=True, use_str=False)
+            result.append((key, value))
+        return result
+
+
 class DNA_IO:
     """
     Module like class, for read-write utility functions.
@@ -942,6 +2390,34 @@ class DNA_IO:
         st = DNA_IO.ULONG[fileheader.endian_index]
         return st.unpack(handle.read(st.size))[0]
 
+    # {dna_type_id: struct format character}
+    NUMBER_FORMATS = {
+        b'int': b'i',
+        b'short': b'h',
+        b'uint64_t': b'Q',
+        b'float': b'f',
+        }
+
+    # {pointer_size: array typecode}
+    POINTER_TYPECODES = {
+        4: 'I',
+        8: 'Q',
+        }
+
+    # matches BlendFileHeader.endian_index
+    ENDIAN_INDEX_NATIVE = 0 if sys.byteorder == 'little' else 1
+
+    @staticmethod
+    def unpack_pointer(data, offset, header):
+        """
+        unpacks a pointer from a buffer
+        the pointer size is given by the header (BlendFileHeader)
+        """
+        if header.pointer_size == 4:
+            return DNA_IO.UINT[header.endian_index].unpack_from(data, offset)[0]
+        if header.pointer_size == 8:
+            return DNA_IO.ULONG[header.endian_index].unpack_from(data, offset)[0]
+
     @staticmethod
     def read_pointer(handle, header):
         """
@@ -24,6 +24,7 @@ A simply utility to copy blend files and their deps to a new location.
 Similar to packing, but don't attempt any path remapping.
 """
 
+from bam.blend import blendfile
 from bam.blend import blendfile_path_walker
 
 TIMEIT = False
@@ -52,12 +53,18 @@ def copy_paths(
         # Filename filter, allow to exclude files from the pack,
         # function takes a string returns True if the files should be included.
         filename_filter=None,
+
+        # blendfile_path_walker.FilePathCache, to skip reading unchanged files.
+        cache=None,
+
+        # number of threads copying files (None for one per CPU).
+        jobs=1,
         ):
 
     import os
-    import shutil
 
     from bam.utils.system import colorize, is_subdir
+    from bam.utils.file_copy import copy_files, throughput_as_str
 
     path_copy_files = set(paths)
 
@@ -65,18 +72,22 @@ def copy_paths(
     lib_visit = {}
 
     yield report("Reading %d blend file(s)\n" % len(paths))
-    for blendfile_src in paths:
-        yield report("  %s:     %r\n" % (colorize("blend", color='blue'), blendfile_src))
-        for fp, (rootdir, fp_blend_basename) in blendfile_path_walker.FilePath.visit_from_blend(
-                blendfile_src,
-                readonly=True,
-                recursive=True,
-                recursive_all=all_deps,
-                lib_visit=lib_visit,
-                ):
-
-            f_abs = os.path.normpath(fp.filepath_absolute)
-            path_copy_files.add(f_abs)
+    # libraries shared by the blend files are only read once
+    with blendfile.BlendFilePool() as pool:
+        for blendfile_src in paths:
+            yield report("  %s:     %r\n" % (colorize("blend", color='blue'), blendfile_src))
+            for fp, (rootdir, fp_blend_basename) in blendfile_path_walker.FilePath.visit_from_blend(
+                    blendfile_src,
+                    readonly=True,
+                    recursive=True,
+                    recursive_all=all_deps,
+                    lib_visit=lib_visit,
+                    pool=pool,
+                    cache=cache,
+                    ):
+
+                f_abs = os.path.normpath(fp.filepath_absolute)
+                path_copy_files.add(f_abs)
 
     # Source -> Dest Map
     path_src_dst_map = {}
@@ -109,6 +120,6 @@ def copy_paths(
 
     # Copy files
     yield report("Copying %d files to %r\n" % (len(path_src_dst_map), output))
-    for path_src, path_dst in sorted(path_src_dst_map.items()):
-        yield report("  %s:     %r -> %r\n" % (colorize("copying", color='blue'), path_src, path_dst))
-        shutil.copy(path_src, path_dst)
+    for path_src, path_dst, size, time_copy, method in copy_files(sorted(path_src_dst_map.items()), jobs=jobs):
+        yield report("  %s:     %r -> %r (%s, %s)\n" % (
+                colorize("copied", color='blue'), path_src, path_dst, throughput_as_str(size, time_copy), method))
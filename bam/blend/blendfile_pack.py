@@ -20,7 +20,8 @@
 
 import os
 import sys
-import shutil
+import functools
+from bam.blend import blendfile
 from bam.blend import blendfile_path_walker
 
 TIMEIT = False
@@ -128,6 +129,8 @@ def pack(
         compress_level=-1,
         # yield reports
         report=None,
+        # number of threads compressing ZIP archive members or copying files (None for one per CPU).
+        jobs=1,
 
         # The project path, eg:
         # /home/me/myproject/mysession/path/to/blend/file.blend
@@ -166,9 +169,10 @@ def pack(
     """
 
     # Internal details:
-    # - we copy to a temp path before operating on the blend file
-    #   so we can modify in-place.
-    # - temp files are only created once, (if we never touched them before),
+    # - blend files are read from their original location,
+    #   edits are recorded in memory (see 'blendfile.BlendFileEdits')
+    #   and applied while writing each blend file to the destination.
+    # - edits are kept per blend file (created the first time it's touched),
     #   this way, for linked libraries - a single blend file may be used
     #   multiple times, each access will apply new edits on top of the old ones.
     # - we track which libs we have touched (using 'lib_visit' arg),
@@ -200,6 +204,12 @@ def pack(
     # path_temp_files --> original-location
     path_temp_files_orig = {}
 
+    # original-location --> blendfile.BlendFileEdits
+    path_temp_files_edits = {}
+
+    # path_temp_files --> uuid (see 'uuid_from_file'), of the written file
+    path_temp_files_uuid = {}
+
     TEMP_SUFFIX = b'@'
 
     if report is None:
@@ -233,9 +243,10 @@ def pack(
             if not os.path.exists(base_dir_dst_temp):
                 break
 
-    def temp_remap_cb(filepath, rootdir):
+    def temp_path(filepath, rootdir):
         """
-        Create temp files in the destination path.
+        Return the temp path of a blend file in the destination path
+        (the blend file is written without TEMP_SUFFIX, see 'blend_write').
         """
         filepath = blendfile_path_walker.utils.compatpath(filepath)
 
@@ -254,18 +265,42 @@ def pack(
         filepath_tmp = _relpath_remap(filepath, base_dir_src, fp_basedir_conv, blendfile_src_dir_fakeroot)[0]
         filepath_tmp = os.path.normpath(os.path.join(base_dir_dst_temp, filepath_tmp)) + TEMP_SUFFIX
 
-        # only overwrite once (so we can write into a path already containing files)
         if filepath_tmp not in path_temp_files:
-            if mode != 'NONE':
-                import shutil
-                os.makedirs(os.path.dirname(filepath_tmp), exist_ok=True)
-                shutil.copy(filepath, filepath_tmp)
             path_temp_files.add(filepath_tmp)
             path_temp_files_orig[filepath_tmp] = filepath
+        return filepath_tmp
+
+    def temp_remap_cb(filepath, rootdir):
+        """
+        Return the temp path of a blend file (the original path when mode is 'NONE').
+        """
+        filepath_tmp = temp_path(filepath, rootdir)
         if mode != 'NONE':
             return filepath_tmp
         else:
-            return filepath
+            return path_temp_files_orig[filepath_tmp]
+
+    def blend_remap_cb(filepath, rootdir):
+        """
+        Return the blend file to read, the original: edits are recorded in 'path_temp_files_edits'
+        (when mode is 'NONE' the blend file is edited in-place).
+        """
+        return path_temp_files_orig[temp_path(filepath, rootdir)]
+
+    def blend_write(filepath_tmp, handle_dst):
+        """
+        Write the blend file with its edits applied (reading the original once),
+        its uuid is calculated at the same time.
+        """
+        from bam.utils.system import UUIDWriter
+
+        filepath = path_temp_files_orig[filepath_tmp]
+        edits = path_temp_files_edits.get(filepath)
+        if edits is None:
+            edits = blendfile.BlendFileEdits()
+        handle_uuid = UUIDWriter(handle_dst)
+        edits.copy_file(filepath, handle_uuid)
+        path_temp_files_uuid[filepath_tmp] = handle_uuid.uuid()
 
     # -----------------
     # Variation Support
@@ -337,7 +372,8 @@ def pack(
     for fp, (rootdir, fp_blend_basename) in blendfile_path_walker.FilePath.visit_from_blend(
             blendfile_src,
             readonly=readonly,
-            temp_remap_cb=temp_remap_cb,
+            temp_remap_cb=blend_remap_cb,
+            edits=path_temp_files_edits if mode != 'NONE' else None,
             recursive=True,
             recursive_all=all_deps,
             lib_visit=lib_visit,
@@ -486,40 +522,37 @@ def pack(
             # reports are handled again, later on.
             if os.path.exists(src):
                 paths_uuid[os.path.relpath(dst, base_dir_dst).decode('utf-8')] = uuid_from_file(src)
-        # XXX, better way to store temp target
-        blendfile_dst_tmp = temp_remap_cb(blendfile_src, base_dir_src)
-        paths_uuid[os.path.basename(blendfile_src).decode('utf-8')] = uuid_from_file(blendfile_dst_tmp)
 
-        # blend libs
-        for dst in path_temp_files:
-            k = os.path.relpath(dst[:-len(TEMP_SUFFIX)], base_dir_dst_temp).decode('utf-8')
-            if k not in paths_uuid:
-                if mode == 'NONE':
-                    dst = path_temp_files_orig[dst]
-                paths_uuid[k] = uuid_from_file(dst)
-            del k
+        # blend files are hashed while writing them (see 'blend_write').
+        if mode == 'NONE':
+            for fn in path_temp_files:
+                # the original blend file (edited in-place).
+                path_temp_files_uuid[fn] = uuid_from_file(path_temp_files_orig[fn])
 
-        del blendfile_dst_tmp
         del uuid_from_file
 
     # --------------------
     # Handle File Copy/Zip
 
     if mode == 'FILE':
-        blendfile_dst_tmp = temp_remap_cb(blendfile_src, base_dir_src)
-
-        shutil.move(blendfile_dst_tmp, blendfile_dst)
-        path_temp_files.remove(blendfile_dst_tmp)
+        blendfile_dst_tmp = temp_path(blendfile_src, base_dir_src)
 
-        # strip TEMP_SUFFIX and move to the destination directory.
-        for fn in path_temp_files:
-            dst_rel, _ = _relpath_remap(fn[:-len(TEMP_SUFFIX)], base_dir_dst_temp, base_dir_dst, None)
-            dst = os.path.join(base_dir_dst, dst_rel)
-            yield report("  %s: %r -> %r\n" % (colorize("moving", color='blue'), fn, dst))
+        # strip TEMP_SUFFIX and write to the destination directory.
+        for fn in sorted(path_temp_files):
+            if fn == blendfile_dst_tmp:
+                dst = blendfile_dst
+            else:
+                dst_rel, _ = _relpath_remap(fn[:-len(TEMP_SUFFIX)], base_dir_dst_temp, base_dir_dst, None)
+                dst = os.path.join(base_dir_dst, dst_rel)
+                yield report("  %s: %r -> %r\n" % (colorize("writing", color='blue'), path_temp_files_orig[fn], dst))
             os.makedirs(os.path.dirname(dst), exist_ok=True)
-            shutil.move(fn, dst)
+            with open(dst, 'wb') as handle_dst:
+                blend_write(fn, handle_dst)
 
-        for src, dst in path_copy_files:
+        from bam.utils.file_copy import copy_files, throughput_as_str
+
+        path_copy_files_exist = []
+        for src, dst in sorted(path_copy_files):
             assert(b'.blend' not in dst)
             assert src != dst
 
@@ -527,41 +560,44 @@ def pack(
             if (not os.path.exists(src)) or os.path.isdir(src):
                 yield report("  %s: %r\n" % (colorize("source missing", color='red'), src))
             else:
-                yield report("  %s: %r -> %r\n" % (colorize("copying", color='blue'), src, dst))
                 os.makedirs(os.path.dirname(dst), exist_ok=True)
-                shutil.copy(src, dst)
+                path_copy_files_exist.append((src, dst))
 
-        shutil.rmtree(base_dir_dst_temp)
+        for src, dst, size, time_copy, method in copy_files(path_copy_files_exist, jobs=jobs):
+            yield report("  %s: %r -> %r (%s, %s)\n" % (
+                    colorize("copied", color='blue'), src, dst, throughput_as_str(size, time_copy), method))
+        del path_copy_files_exist
 
         yield report("  %s: %r\n" % (colorize("written", color='green'), blendfile_dst))
 
     elif mode == 'ZIP':
         import zipfile
+        from bam.utils.zip_writer import ZipWriter
 
-        # not awesome!
-        import zlib
         assert(compress_level in range(-1, 10))
-        _compress_level_orig = zlib.Z_DEFAULT_COMPRESSION
-        zlib.Z_DEFAULT_COMPRESSION = compress_level
         _compress_mode = zipfile.ZIP_STORED if (compress_level == 0) else zipfile.ZIP_DEFLATED
         if _compress_mode == zipfile.ZIP_STORED:
-            def is_compressed_filetype(fn):
+            def is_compressed_file(fn):
                 return False
         else:
-            from bam.utils.system import is_compressed_filetype
-
-        with zipfile.ZipFile(blendfile_dst.decode('utf-8'), 'w', _compress_mode) as zip_handle:
-            for fn in path_temp_files:
-                yield report("  %s: %r -> <archive>\n" % (colorize("copying", color='blue'), fn))
-                zip_handle.write(
-                        fn.decode('utf-8'),
-                        arcname=os.path.relpath(fn[:-1], base_dir_dst_temp).decode('utf-8'),
+            from bam.utils.system import is_compressed_file
+
+        # members are compressed by 'jobs' threads, sort so the archive is always the same.
+        with zipfile.ZipFile(blendfile_dst.decode('utf-8'), 'w', _compress_mode) as zip_handle, \
+             ZipWriter(zip_handle, compress_level=compress_level, jobs=jobs, temp_dir=base_dir_dst) as zip_writer:
+            for fn in sorted(path_temp_files):
+                src = path_temp_files_orig[fn]
+                yield report("  %s: %r -> <archive>\n" % (colorize("copying", color='blue'), src))
+                # write directly into the archive, 'file_size' is used to check if ZIP64 is needed.
+                zip_info = zipfile.ZipInfo.from_file(
+                        src.decode('utf-8'),
+                        arcname=os.path.relpath(fn[:-len(TEMP_SUFFIX)], base_dir_dst_temp).decode('utf-8'),
                         )
-                os.remove(fn)
+                # compressed blend files (edits don't change this).
+                zip_info.compress_type = zipfile.ZIP_STORED if is_compressed_file(src) else _compress_mode
+                zip_writer.write_from(zip_info, functools.partial(blend_write, fn))
 
-            shutil.rmtree(base_dir_dst_temp)
-
-            for src, dst in path_copy_files:
+            for src, dst in sorted(path_copy_files):
                 assert(not dst.endswith(b'.blend'))
 
                 # in rare cases a filepath could point to a directory
@@ -569,14 +605,13 @@ def pack(
                     yield report("  %s: %r\n" % (colorize("source missing", color='red'), src))
                 else:
                     yield report("  %s: %r -> <archive>\n" % (colorize("copying", color='blue'), src))
-                    zip_handle.write(
+                    zip_writer.write(
                             src.decode('utf-8'),
                             arcname=os.path.relpath(dst, base_dir_dst).decode('utf-8'),
-                            compress_type=zipfile.ZIP_STORED if is_compressed_filetype(dst) else _compress_mode,
+                            compress_type=zipfile.ZIP_STORED if is_compressed_file(src) else _compress_mode,
                             )
 
-        zlib.Z_DEFAULT_COMPRESSION = _compress_level_orig
-        del _compress_level_orig, _compress_mode
+        del _compress_mode
 
         yield report("  %s: %r\n" % (colorize("written", color='green'), blendfile_dst))
     elif mode == 'NONE':
@@ -584,6 +619,20 @@ def pack(
     else:
         raise Exception("%s not a known mode" % mode)
 
+    if paths_uuid is not None:
+        # XXX, better way to store temp target
+        blendfile_dst_tmp = temp_path(blendfile_src, base_dir_src)
+        paths_uuid[os.path.basename(blendfile_src).decode('utf-8')] = path_temp_files_uuid[blendfile_dst_tmp]
+
+        # blend libs
+        for dst in path_temp_files:
+            k = os.path.relpath(dst[:-len(TEMP_SUFFIX)], base_dir_dst_temp).decode('utf-8')
+            if k not in paths_uuid:
+                paths_uuid[k] = path_temp_files_uuid[dst]
+            del k
+
+        del blendfile_dst_tmp
+
 
 def create_argparse():
     import argparse
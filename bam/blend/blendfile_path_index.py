@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+
+# ***** BEGIN GPL LICENSE BLOCK *****
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+# ***** END GPL LICENCE BLOCK *****
+
+"""
+Project wide index of the paths referenced by blend files,
+to find which blend files depend on a file (reverse dependencies).
+"""
+
+import os
+
+
+def _is_blend(f):
+    return f.lower().endswith(b'.blend')
+
+
+def _iter_blends(rootdir):
+    # note, sorting isn't needed
+    # just gives predictable output
+    for dirpath, dirnames, filenames in os.walk(rootdir):
+        # skip '.bam', '.svn' ... etc
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith(b'.'))
+        for filename in sorted(filenames):
+            if _is_blend(filename):
+                yield os.path.join(dirpath, filename)
+
+
+class FilePathIndex:
+    """
+    Index of the paths each blend file references directly (stored in an sqlite database),
+    only blend files which changed since the last update are read again.
+
+    Dependencies through libraries are resolved when querying,
+    since the index is per file, any file used by a library counts as used by the blend files linking it.
+    """
+    __slots__ = (
+        "filepath",
+        "db",
+        )
+
+    # increment when the stored data changes
+    VERSION = 1
+
+    def __init__(self, filepath):
+        import sqlite3
+
+        self.filepath = filepath
+        self.db = sqlite3.connect(filepath)
+        try:
+            if self.db.execute("PRAGMA user_version").fetchone()[0] != FilePathIndex.VERSION:
+                with self.db:
+                    self.db.execute("DROP TABLE IF EXISTS blend")
+                    self.db.execute("DROP TABLE IF EXISTS ref")
+                    self.db.execute("PRAGMA user_version=%d" % FilePathIndex.VERSION)
+            with self.db:
+                self.db.execute(
+                        "CREATE TABLE IF NOT EXISTS blend ("
+                        "filepath BLOB PRIMARY KEY, size INTEGER, mtime_ns INTEGER, inode INTEGER)"
+                        )
+                # 'code' is the ID code of the block referencing the file (b'IM', b'LI' ... etc).
+                self.db.execute(
+                        "CREATE TABLE IF NOT EXISTS ref ("
+                        "blend BLOB, filepath BLOB, code BLOB)"
+                        )
+                self.db.execute("CREATE INDEX IF NOT EXISTS ref_blend ON ref (blend)")
+                self.db.execute("CREATE INDEX IF NOT EXISTS ref_filepath ON ref (filepath)")
+        except BaseException:
+            self.close()
+            raise
+
+    @staticmethod
+    def from_basedir(basedir, filename="deps_index.db"):
+        """
+        Return an index stored in a directory (typically a projects ``.bam`` directory).
+        """
+        return FilePathIndex(os.path.join(basedir, filename))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    @staticmethod
+    def _blend_refs(filepath):
+        """
+        Return the [(filepath, code), ...] referenced directly by a blend file.
+        """
+        from bam.blend import blendfile_path_walker
+
+        refs = []
+        for fp, (rootdir, fp_blend_basename) in blendfile_path_walker.FilePath.visit_from_blend(
+                filepath,
+                readonly=True,
+                recursive=False,
+                ):
+            code = fp.userdata[0].code
+            f_abs = os.path.normpath(fp.filepath_absolute)
+            refs.append((f_abs, code))
+            # image sequences depend on every frame
+            if fp.is_sequence:
+                f_dir = os.path.dirname(f_abs)
+                for f in fp.files_siblings():
+                    refs.append((os.path.join(f_dir, f), code))
+        return refs
+
+    def update(self, rootdir, report=None):
+        """
+        Update the index for all blend files in ``rootdir``,
+        reading only the blend files that were added or changed since the last update.
+
+        Returns the number of blend files read.
+        """
+        from bam.blend.blendfile_path_walker import FilePathCache
+
+        rootdir = os.path.abspath(rootdir)
+        rootdir_prefix = os.path.join(rootdir, b'')
+
+        blends_stat = {
+            filepath: (size, mtime_ns, inode)
+            for filepath, size, mtime_ns, inode in self.db.execute(
+                    "SELECT filepath, size, mtime_ns, inode FROM blend")
+            if filepath.startswith(rootdir_prefix)
+            }
+
+        blends_read = 0
+        for filepath in _iter_blends(rootdir):
+            stat = FilePathCache.stat_key(filepath)
+            if stat is None:
+                # removed or unreadable, the entry is removed below.
+                continue
+            if blends_stat.pop(filepath, None) == stat:
+                continue
+
+            if report is not None:
+                report("  index: %r\n" % filepath)
+
+            refs = self._blend_refs(filepath)
+            blends_read += 1
+            with self.db:
+                self.db.execute("DELETE FROM ref WHERE blend=?", (filepath,))
+                self.db.executemany(
+                        "INSERT INTO ref VALUES (?, ?, ?)",
+                        [(filepath, f_abs, code) for f_abs, code in refs],
+                        )
+                self.db.execute("INSERT OR REPLACE INTO blend VALUES (?, ?, ?, ?)", (filepath,) + stat)
+
+        # blend files which have been removed
+        with self.db:
+            for filepath in blends_stat.keys():
+                self.db.execute("DELETE FROM ref WHERE blend=?", (filepath,))
+                self.db.execute("DELETE FROM blend WHERE filepath=?", (filepath,))
+
+        return blends_read
+
+    def rdeps(self, filepath, recursive=True):
+        """
+        Yield (blend, filepath_ref, code, level) for each blend file depending on ``filepath``.
+
+        Where ``filepath_ref`` is the path referenced by ``blend`` (``filepath`` or a library using it),
+        ``code`` the ID code of the referencing block and ``level`` is 1 for direct dependencies,
+        2 for blend files linking a library which uses ``filepath`` ... etc.
+        """
+        filepath = os.path.normpath(os.path.abspath(filepath))
+
+        visited = {filepath}
+        refs_level = [filepath]
+        level = 1
+        while refs_level:
+            refs_next = []
+            for filepath_ref in refs_level:
+                for blend, code in self.db.execute(
+                        "SELECT DISTINCT blend, code FROM ref WHERE filepath=? ORDER BY blend, code",
+                        (filepath_ref,),
+                        ):
+                    yield blend, filepath_ref, code, level
+                    if blend not in visited:
+                        visited.add(blend)
+                        refs_next.append(blend)
+
+            if not recursive:
+                break
+            refs_level = refs_next
+            level += 1
@@ -91,6 +91,8 @@ def start(
         is_quiet=False,
         dry_run=False,
         use_json=False,
+        # blendfile_path_walker.FilePathCache, to skip reading unchanged files.
+        cache=None,
         ):
 
     if use_json:
@@ -132,6 +134,7 @@ def start(
                 blendfile_src,
                 readonly=True,
                 recursive=False,
+                cache=cache,
                 ):
             # TODO. warn when referencing files outside 'paths'
 
@@ -216,10 +216,289 @@ class FPElem_sequence_image_seq(FPElem_sequence_single):
         block, path, sub_block, sub_path = self.userdata
 
         array = block.get_pointer(b'stripdata')
-        files = [array.get(b'name', use_str=False, base_index=i) for i in range(array.count)]
+        files = array.get_array(b'name', use_str=False)
         return files
 
 
+class FPElem_record_block:
+    """
+    Stands in for the block of an :class:`FPElem_record`,
+    so ``fp.userdata[0].code`` works for records too.
+    """
+    __slots__ = (
+        # bytes
+        "code",
+        # int
+        "file_offset",
+        )
+
+    def __init__(self, code, file_offset):
+        self.code = code
+        self.file_offset = file_offset
+
+    def __repr__(self):
+        return "<%s %r at %d>" % (self.__class__.__qualname__, self.code, self.file_offset)
+
+
+class FPElem_record(FPElem):
+    """
+    Read-only copy of another FPElem, without references to the blend file (so it can be pickled).
+        userdata = (FPElem_record_block, path, file_offset, filepath, files_siblings)
+    """
+    __slots__ = ()
+
+    @staticmethod
+    def from_fp(fp):
+        block, path = fp.userdata[:2]
+        ofs = block.file_offset + block.dna_type.field_offset_from_path(block.file.header, path)[1]
+        record = FPElem_record(
+                fp.basedir, fp.level,
+                (FPElem_record_block(block.code, block.file_offset), path, ofs, fp.filepath, tuple(fp.files_siblings())),
+                )
+        record.is_sequence = fp.is_sequence
+        return record
+
+    def files_siblings(self):
+        return self.userdata[4]
+
+    def _get_cb(self):
+        return self.userdata[3]
+
+    def _set_cb(self, filepath):
+        raise RuntimeError("%s is read-only" % type(self).__name__)
+
+    def _set_cb_edits(self, filepath, binary_edits):
+        raise RuntimeError("%s is read-only" % type(self).__name__)
+
+
+def _visit_lib_records(
+        lib_path_abs, lib_block_codes, rootdir, level, lib_block_codes_existing, path_codes, cache_filepath,
+        ):
+    """
+    Visit a library for :meth:`FilePath.visit_from_blend_parallel` (runs in a worker process).
+
+    Returns (records, lib_block_codes_existing, lib_pending).
+    """
+    import contextlib
+    lib_visit = {lib_path_abs: lib_block_codes_existing}
+    lib_pending = []
+    with contextlib.ExitStack() as stack:
+        cache = None
+        if cache_filepath is not None:
+            import sqlite3
+            try:
+                cache = stack.enter_context(FilePathCache(cache_filepath))
+            except (sqlite3.Error, OSError):
+                pass
+        records = [
+            (fp if isinstance(fp, FPElem_record) else FPElem_record.from_fp(fp), extra_info)
+            for fp, extra_info in FilePath.visit_from_blend(
+                    lib_path_abs,
+                    readonly=True,
+                    recursive=True,
+                    block_codes=lib_block_codes,
+                    rootdir=rootdir,
+                    level=level,
+                    lib_visit=lib_visit,
+                    path_codes=path_codes,
+                    lib_pending=lib_pending,
+                    cache=cache,
+                    )
+            ]
+    return records, lib_visit[lib_path_abs], lib_pending
+
+
+class FilePathCache:
+    """
+    On-disk cache of the paths found in each blend file (an sqlite database),
+    so unchanged files don't need to be read again by :meth:`FilePath.visit_from_blend`.
+
+    Each entry stores the direct path records and library references of one visit,
+    keyed by the file (path, size, mtime_ns, inode) and the blocks requested from it.
+    """
+    __slots__ = (
+        "filepath",
+        "db",
+        )
+
+    # increment when the stored data changes
+    VERSION = 2
+
+    def __init__(self, filepath):
+        import sqlite3
+
+        self.filepath = filepath
+        # a busy timeout, since worker processes may write at once
+        self.db = sqlite3.connect(filepath, timeout=60.0)
+        try:
+            try:
+                # readers don't wait for writers
+                self.db.execute("PRAGMA journal_mode=WAL")
+            except sqlite3.Error as ex:
+                # not supported by some file-systems (network shares), keep the default journal.
+                log_deps.debug("WAL journal not used for %r, %s" % (filepath, ex))
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            if self.db.execute("PRAGMA user_version").fetchone()[0] != FilePathCache.VERSION:
+                with self.db:
+                    self.db.execute("DROP TABLE IF EXISTS visit")
+                    self.db.execute("PRAGMA user_version=%d" % FilePathCache.VERSION)
+            with self.db:
+                self.db.execute(
+                        "CREATE TABLE IF NOT EXISTS visit ("
+                        "filepath BLOB, size INTEGER, mtime_ns INTEGER, inode INTEGER, "
+                        "request BLOB, data TEXT, "
+                        "PRIMARY KEY (filepath, request))"
+                        )
+        except BaseException:
+            self.close()
+            raise
+
+    @staticmethod
+    def from_basedir(basedir, filename="deps_cache.db"):
+        """
+        Return a cache stored in a directory (typically a projects ``.bam`` directory).
+        """
+        import os
+        return FilePathCache(os.path.join(basedir, filename))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    @staticmethod
+    def stat_key(filepath):
+        """
+        Return the signature of a file: (size, mtime_ns, inode) or None when it can't be accessed.
+        """
+        import os
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns, st.st_ino
+
+    @staticmethod
+    def request_key(recursive, block_codes, lib_block_codes_existing, path_codes=None):
+        """
+        Return a key for the blocks requested from a file,
+        ``lib_block_codes_existing`` is None unless ID's are being expanded.
+        """
+        import hashlib
+        request = repr((
+                bool(recursive),
+                None if block_codes is None else sorted(block_codes),
+                None if lib_block_codes_existing is None else sorted(lib_block_codes_existing),
+                None if path_codes is None else sorted(path_codes),
+                )).encode('utf-8')
+        return hashlib.blake2b(request, digest_size=16).digest()
+
+    def get(self, filepath, stat, request):
+        """
+        Return the stored (records, lib_block_codes_added, lib_all) or None.
+        """
+        import sqlite3
+        try:
+            row = self.db.execute(
+                    "SELECT size, mtime_ns, inode, data FROM visit WHERE filepath=? AND request=?",
+                    (filepath, request),
+                    ).fetchone()
+        except sqlite3.Error as ex:
+            log_deps.debug("dependency cache not read, %s" % ex)
+            return None
+        if row is None or tuple(row[:3]) != stat:
+            return None
+        try:
+            return FilePathCache._data_decode(row[3])
+        except (ValueError, TypeError, AttributeError, UnicodeError):
+            # not written by this version (or corrupt), read the file instead.
+            return None
+
+    def set(self, filepath, stat, request, records, lib_block_codes_added, lib_all):
+        import sqlite3
+        data = FilePathCache._data_encode(records, lib_block_codes_added, lib_all)
+        try:
+            with self.db:
+                # entries for older versions of this file are never used again
+                self.db.execute(
+                        "DELETE FROM visit WHERE filepath=? AND (size!=? OR mtime_ns!=? OR inode!=?)",
+                        (filepath,) + stat,
+                        )
+                self.db.execute(
+                        "INSERT OR REPLACE INTO visit VALUES (?, ?, ?, ?, ?, ?)",
+                        (filepath,) + stat + (request, data),
+                        )
+        except sqlite3.Error as ex:
+            # a read-only database, the file is read again next time.
+            log_deps.debug("dependency cache not written, %s" % ex)
+
+    # Entries are stored as JSON (never code, since the database may be shared),
+    # bytes are stored as strings, decoded as latin-1 (any byte is a valid character).
+
+    @staticmethod
+    def _data_encode(records, lib_block_codes_added, lib_all):
+        import json
+
+        def b2s(data):
+            return data.decode('latin-1')
+
+        records_data = []
+        for fp in records:
+            block, path, ofs, filepath, files_siblings = fp.userdata
+            records_data.append([
+                b2s(block.code), block.file_offset,
+                b2s(path) if type(path) is bytes else [b2s(p) for p in path],
+                ofs, b2s(filepath), [b2s(f) for f in files_siblings],
+                fp.is_sequence,
+                ])
+
+        return json.dumps([
+            records_data,
+            None if lib_block_codes_added is None else sorted(b2s(id_name) for id_name in lib_block_codes_added),
+            None if lib_all is None else [
+                [b2s(lib_path), sorted(b2s(id_name) for id_name in lib_block_codes)]
+                for lib_path, lib_block_codes in lib_all
+                ],
+            ])
+
+    @staticmethod
+    def _data_decode(data):
+        import json
+
+        def s2b(text):
+            if type(text) is not str:
+                raise TypeError("expected a string, not %r" % type(text))
+            return text.encode('latin-1')
+
+        records_data, lib_block_codes_added, lib_all = json.loads(data)
+        records = []
+        for code, block_offset, path, ofs, filepath, files_siblings, is_sequence in records_data:
+            record = FPElem_record(
+                    None, 0,
+                    (
+                        FPElem_record_block(s2b(code), int(block_offset)),
+                        s2b(path) if type(path) is str else tuple(s2b(p) for p in path),
+                        int(ofs), s2b(filepath), tuple(s2b(f) for f in files_siblings),
+                        ),
+                    )
+            record.is_sequence = bool(is_sequence)
+            records.append(record)
+        if lib_block_codes_added is not None:
+            lib_block_codes_added = {s2b(id_name) for id_name in lib_block_codes_added}
+        if lib_all is not None:
+            lib_all = [
+                (s2b(lib_path), {s2b(id_name) for id_name in lib_block_codes})
+                for lib_path, lib_block_codes in lib_all
+                ]
+        return records, lib_block_codes_added, lib_all
+
+
 class FilePath:
     __slots__ = ()
 
@@ -251,15 +530,57 @@ class FilePath:
             # prevents cyclic references too!
             # {lib_path: set([block id's ...])}
             lib_visit=None,
+            # set of ID codes to find paths for ({b'IM', b'LI'} ... see '_from_block_dict'), None for all.
+            # ID's which can't lead to these aren't read or expanded.
+            path_codes=None,
 
             # optional blendfile callbacks
             # These callbacks run on enter-exit blend files
             # so you can keep track of what file and level you're at.
             blendfile_level_cb=(None, None),
+
+            # blendfile.BlendFilePool, so files visited many times are only read once.
+            # When None, a pool is used for this call (closed once all paths have been visited).
+            pool=None,
+
+            # internal, when visiting breadth first:
+            # [(lib_path_abs, lib_block_codes), ...] libraries are added here instead of being visited.
+            lib_pending=None,
+
+            # FilePathCache, paths of unchanged files are replayed instead of reading the file.
+            # Only used when 'readonly' (cached paths can't be changed),
+            # in this case FPElem_record's are yielded for cached files.
+            cache=None,
+
+            # dict {filepath: blendfile.BlendFileEdits}, when set (and not 'readonly'),
+            # blend files are opened read-only and changes are recorded here instead of being written,
+            # keyed by the path returned from 'temp_remap_cb' (see BlendFileEdits.copy_file).
+            edits=None,
             ):
         # print(level, block_codes)
         import os
 
+        if pool is None:
+            with blendfile.BlendFilePool() as pool:
+                yield from FilePath.visit_from_blend(
+                        filepath,
+                        readonly=readonly,
+                        temp_remap_cb=temp_remap_cb,
+                        recursive=recursive,
+                        recursive_all=recursive_all,
+                        block_codes=block_codes,
+                        rootdir=rootdir,
+                        level=level,
+                        lib_visit=lib_visit,
+                        path_codes=path_codes,
+                        blendfile_level_cb=blendfile_level_cb,
+                        pool=pool,
+                        lib_pending=lib_pending,
+                        cache=cache,
+                        edits=edits,
+                        )
+            return
+
         filepath = os.path.abspath(filepath)
 
         indent_str = "  " * level
@@ -284,7 +605,13 @@ class FilePath:
         if lib_visit is None:
             lib_visit = {}
 
-
+        # ID codes worth expanding (None for all).
+        # Any linked ID may lead to a library, so only libraries found via ID's
+        # that can lead to 'path_codes' are followed (unless we're looking for libraries).
+        if (path_codes is None) or (recursive and b'LI' in path_codes):
+            expand_codes_reach = None
+        else:
+            expand_codes_reach = ExpandID.expand_codes_reach(path_codes)
 
         if recursive and (level > 0) and (block_codes is not None) and (recursive_all is False):
             # prevent from expanding the
@@ -311,9 +638,16 @@ class FilePath:
                 if code == b'ID':
                     assert(code == block.code)
                     if recursive:
-                        expand_codes_idlib.setdefault(block[b'lib'], set()).add(block[b'name'])
+                        id_name = block[b'name']
+                        if (expand_codes_reach is None) or (id_name[:2] in expand_codes_reach):
+                            expand_codes_idlib.setdefault(block[b'lib'], set()).add(id_name)
                     return False
                 else:
+                    # already expanded (ID's used by many others, materials, node groups... etc),
+                    # no need to read the name.
+                    if block.addr_old in expand_addr_visit:
+                        return False
+
                     id_name = block[b'id', b'name']
 
                     # if we touched this already, don't touch again
@@ -346,11 +680,9 @@ class FilePath:
                     yield block
 
                     assert(block.code == code)
-                    fn = ExpandID.expand_funcs.get(code)
-                    if fn is not None:
-                        for sub_block in fn(block):
-                            if sub_block is not None:
-                                yield from block_expand(sub_block, sub_block.code)
+                    if (expand_codes_reach is None) or (code in expand_codes_reach):
+                        for sub_block in ExpandID.expand(block):
+                            yield from block_expand(sub_block, sub_block.code)
                 else:
                     if code == b'ID':
                         yield block
@@ -380,9 +712,15 @@ class FilePath:
                 return blend.find_blocks_from_code(b'LI')
         else:
             def iter_blocks_id(code):
-                for block in blend.find_blocks_from_code(code):
-                    if block[b'id', b'name'] in block_codes:
-                        yield from block_expand(block, code)
+                blocks = [
+                    block
+                    for id_name in block_codes if id_name[:2] == code
+                    for block in blend.find_blocks_from_id_name(id_name, code)
+                    ]
+                # file order
+                blocks.sort(key=lambda block: block.file_offset)
+                for block in blocks:
+                    yield from block_expand(block, code)
 
             if block_codes_idlib is not None:
                 def iter_blocks_idlib():
@@ -402,61 +740,147 @@ class FilePath:
         # store info to pass along with each iteration
         extra_info = rootdir, os.path.basename(filepath)
 
-        with blendfile.open_blend(filepath_tmp, "rb" if readonly else "r+b") as blend:
-
-            for code in blend.code_index.keys():
-                # handle library blocks as special case
-                if ((len(code) != 2) or
-                    (code in {
-                        # libraries handled below
-                        b'LI',
-                        b'ID',
-                        # unneeded
-                        b'WM',
-                        b'SN',  # bScreen
-                        })):
+        # only index ID blocks we may use, other blocks are read when referenced.
+        if block_codes is None:
+            blend_codes = set(FilePath._from_block_dict.keys())
+        else:
+            blend_codes = {id_name[:2] for id_name in block_codes}
+        if expand_addr_visit is None:
+            if path_codes is not None:
+                blend_codes &= path_codes
+        elif expand_codes_reach is not None:
+            blend_codes &= expand_codes_reach
+        blend_codes.update((b'LI', b'ID'))
+
+        if cache is not None and readonly and (temp_remap_cb is None):
+            cache_stat = FilePathCache.stat_key(filepath)
+        else:
+            cache_stat = None
+
+        if cache_stat is not None:
+            is_expand = (expand_addr_visit is not None)
+            cache_request = FilePathCache.request_key(
+                    recursive, block_codes,
+                    lib_block_codes_existing if is_expand else None,
+                    path_codes,
+                    )
+            cache_item = cache.get(filepath, cache_stat, cache_request)
+        else:
+            cache_item = None
+
+        if cache_item is not None:
+            records, lib_block_codes_added, lib_all = cache_item
+            if lib_block_codes_added:
+                lib_visit.setdefault(filepath, set()).update(lib_block_codes_added)
+            for fp in records:
+                fp.basedir = basedir
+                fp.level = level
+                yield fp, extra_info
+            del records, lib_block_codes_added
+        else:
+            if cache_stat is not None:
+                cache_records = []
+                lib_block_codes_prev = set(lib_block_codes_existing) if is_expand else None
+
+                def from_block(block):
+                    if (path_codes is not None) and (block.code not in path_codes):
+                        return
+                    for fp, fp_extra_info in FilePath.from_block(block, basedir, extra_info, level):
+                        cache_records.append(FPElem_record.from_fp(fp))
+                        yield fp, fp_extra_info
+            else:
+                def from_block(block):
+                    if (path_codes is not None) and (block.code not in path_codes):
+                        return ()
+                    return FilePath.from_block(block, basedir, extra_info, level)
+
+            if readonly:
+                blend_edits = None
+            elif edits is not None:
+                blend_edits = edits.get(filepath_tmp)
+                if blend_edits is None:
+                    blend_edits = edits[filepath_tmp] = blendfile.BlendFileEdits()
+            else:
+                blend_edits = None
+
+            with pool.open(
+                    filepath_tmp,
+                    "r+b" if (not readonly and blend_edits is None) else "rb",
+                    codes=blend_codes,
+                    edits=blend_edits,
+                    ) as blend:
+
+                for code in blend.code_index.keys():
+                    # handle library blocks as special case
+                    if ((len(code) != 2) or
+                        (code in {
+                            # libraries handled below
+                            b'LI',
+                            b'ID',
+                            # unneeded
+                            b'WM',
+                            b'SN',  # bScreen
+                            })):
+
+                        continue
+
+                    # skip ID's which can't lead to the paths we're looking for
+                    if expand_addr_visit is None:
+                        if (path_codes is not None) and (code not in path_codes):
+                            continue
+                    elif (expand_codes_reach is not None) and (code not in expand_codes_reach):
+                        continue
 
-                    continue
+                    # if VERBOSE:
+                    #     print("  Scanning", code)
 
-                # if VERBOSE:
-                #     print("  Scanning", code)
+                    for block in iter_blocks_id(code):
+                        yield from from_block(block)
 
-                for block in iter_blocks_id(code):
-                    yield from FilePath.from_block(block, basedir, extra_info, level)
+                # print("A:", expand_addr_visit)
+                # print("B:", block_codes)
+                if VERBOSE:
+                    log.info("%s expand_addr_visit=%s", indent_str, set_as_str(expand_addr_visit))
 
-            # print("A:", expand_addr_visit)
-            # print("B:", block_codes)
-            if VERBOSE:
-                log.info("%s expand_addr_visit=%s", indent_str, set_as_str(expand_addr_visit))
+                if recursive:
 
-            if recursive:
+                    if expand_codes_idlib is None:
+                        expand_codes_idlib = {}
+                        for block in blend.find_blocks_from_code(b'ID'):
+                            id_name = block[b'name']
+                            if (expand_codes_reach is None) or (id_name[:2] in expand_codes_reach):
+                                expand_codes_idlib.setdefault(block[b'lib'], set()).add(id_name)
 
-                if expand_codes_idlib is None:
-                    expand_codes_idlib = {}
-                    for block in blend.find_blocks_from_code(b'ID'):
-                        expand_codes_idlib.setdefault(block[b'lib'], set()).add(block[b'name'])
+                    # look into libraries
+                    lib_all = []
 
-                # look into libraries
-                lib_all = []
+                    for lib_id, lib_block_codes in sorted(expand_codes_idlib.items()):
+                        lib = blend.find_block_from_offset(lib_id)
+                        lib_path = lib[b'name']
 
-                for lib_id, lib_block_codes in sorted(expand_codes_idlib.items()):
-                    lib = blend.find_block_from_offset(lib_id)
-                    lib_path = lib[b'name']
+                        # get all data needed to read the blend files here (it will be freed!)
+                        # lib is an address at the moment, we only use as a way to group
 
-                    # get all data needed to read the blend files here (it will be freed!)
-                    # lib is an address at the moment, we only use as a way to group
+                        lib_all.append((lib_path, lib_block_codes))
+                        # import IPython; IPython.embed()
 
-                    lib_all.append((lib_path, lib_block_codes))
-                    # import IPython; IPython.embed()
+                        # ensure we expand indirect linked libs
+                        if block_codes_idlib is not None:
+                            block_codes_idlib.add(lib_path)
 
-                    # ensure we expand indirect linked libs
-                    if block_codes_idlib is not None:
-                        block_codes_idlib.add(lib_path)
+                # do this after, incase we mangle names above
+                for block in iter_blocks_idlib():
+                    yield from from_block(block)
+            del blend
 
-            # do this after, incase we mangle names above
-            for block in iter_blocks_idlib():
-                yield from FilePath.from_block(block, basedir, extra_info, level)
-        del blend
+            if cache_stat is not None:
+                cache.set(
+                        filepath, cache_stat, cache_request,
+                        cache_records,
+                        (lib_block_codes_existing - lib_block_codes_prev) if is_expand else None,
+                        lib_all if recursive else None,
+                        )
+                del cache_records
 
 
         # ----------------
@@ -464,10 +888,7 @@ class FilePath:
         if recursive:
             # now we've closed the file, loop on other files
 
-            # note, sorting - isn't needed, it just gives predictable load-order.
-            for lib_path, lib_block_codes in lib_all:
-                lib_path_abs = os.path.normpath(utils.compatpath(utils.abspath(lib_path, basedir)))
-
+            def visit_lib(lib_path_abs, lib_block_codes, lib_level, lib_pending):
                 # if we visited this before,
                 # check we don't follow the same links more than once
                 lib_block_codes_existing = lib_visit.setdefault(lib_path_abs, set())
@@ -482,12 +903,12 @@ class FilePath:
                 if not lib_block_codes:
                     if VERBOSE:
                         print((indent_str + "  "), "Library Skipped (visited): ", filepath, " -> ", lib_path_abs, sep="")
-                    continue
+                    return
 
                 if not os.path.exists(lib_path_abs):
                     if VERBOSE:
                         print((indent_str + "  "), "Library Missing: ", filepath, " -> ", lib_path_abs, sep="")
-                    continue
+                    return
 
                 # import IPython; IPython.embed()
                 if VERBOSE:
@@ -500,14 +921,131 @@ class FilePath:
                         recursive=True,
                         block_codes=lib_block_codes,
                         rootdir=rootdir,
-                        level=level + 1,
+                        level=lib_level,
                         lib_visit=lib_visit,
+                        path_codes=path_codes,
                         blendfile_level_cb=blendfile_level_cb,
+                        pool=pool,
+                        lib_pending=lib_pending,
+                        cache=cache,
+                        edits=edits,
                         )
 
+            # note, sorting - isn't needed, it just gives predictable load-order.
+            lib_all = [
+                (os.path.normpath(utils.compatpath(utils.abspath(lib_path, basedir))), lib_block_codes)
+                for lib_path, lib_block_codes in lib_all
+                ]
+
+            if lib_pending is not None:
+                # breadth first, the caller visits these (see below).
+                lib_pending.extend(lib_all)
+            elif (blendfile_level_cb_enter is None) and (blendfile_level_cb_exit is None):
+                # Breadth first, for each level of links, visit every library once
+                # with all ID's the previous level requested from it.
+                # (not used with level callbacks, these expect each library to be visited from the file linking it).
+                lib_level = level
+                while lib_all:
+                    lib_level += 1
+                    lib_requests = FilePath.lib_requests_merge(lib_all)
+                    lib_all = []
+                    for lib_path_abs, lib_block_codes in lib_requests:
+                        yield from visit_lib(lib_path_abs, lib_block_codes, lib_level, lib_all)
+            else:
+                for lib_path_abs, lib_block_codes in lib_all:
+                    yield from visit_lib(lib_path_abs, lib_block_codes, level + 1, None)
+
         if blendfile_level_cb_exit is not None:
             blendfile_level_cb_exit(filepath)
 
+    @staticmethod
+    def lib_requests_merge(lib_all):
+        """
+        Merge requests for the same library,
+        takes [(lib_path_abs, lib_block_codes), ...] and returns the same (in order of first request).
+        """
+        lib_requests = {}
+        lib_paths = []
+        for lib_path_abs, lib_block_codes in lib_all:
+            lib_block_codes_all = lib_requests.get(lib_path_abs)
+            if lib_block_codes_all is None:
+                lib_requests[lib_path_abs] = set(lib_block_codes)
+                lib_paths.append(lib_path_abs)
+            else:
+                lib_block_codes_all.update(lib_block_codes)
+        return [(lib_path_abs, lib_requests[lib_path_abs]) for lib_path_abs in lib_paths]
+
+    @staticmethod
+    def visit_from_blend_parallel(
+            filepath,
+
+            recursive=False,
+            # see 'visit_from_blend'
+            lib_visit=None,
+            path_codes=None,
+            # number of worker processes, None for the number of CPU's
+            jobs=None,
+            # see 'visit_from_blend', worker processes open their own connection.
+            cache=None,
+            ):
+        """
+        Same as :meth:`visit_from_blend` (read-only),
+        where the libraries linked at each level are visited by worker processes at once.
+
+        Yields :class:`FPElem_record` (the paths can't be changed).
+        """
+        import os
+
+        filepath = os.path.abspath(filepath)
+        rootdir = os.path.dirname(filepath)
+        if lib_visit is None:
+            lib_visit = {}
+
+        lib_all = []
+        for fp, extra_info in FilePath.visit_from_blend(
+                filepath,
+                readonly=True,
+                recursive=recursive,
+                lib_visit=lib_visit,
+                path_codes=path_codes,
+                lib_pending=lib_all,
+                cache=cache,
+                ):
+            if not isinstance(fp, FPElem_record):
+                fp = FPElem_record.from_fp(fp)
+            yield fp, extra_info
+
+        if not lib_all:
+            return
+
+        import concurrent.futures
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            lib_level = 0
+            while lib_all:
+                lib_level += 1
+                futures = []
+                for lib_path_abs, lib_block_codes in FilePath.lib_requests_merge(lib_all):
+                    # same as 'visit_from_blend'
+                    lib_block_codes_existing = lib_visit.setdefault(lib_path_abs, set())
+                    lib_block_codes -= lib_block_codes_existing
+                    if not lib_block_codes:
+                        continue
+                    if not os.path.exists(lib_path_abs):
+                        continue
+                    futures.append((lib_path_abs, executor.submit(
+                            _visit_lib_records,
+                            lib_path_abs, lib_block_codes, rootdir, lib_level, lib_block_codes_existing,
+                            path_codes, None if cache is None else cache.filepath,
+                            )))
+
+                # merge results in a predictable order
+                lib_all = []
+                for lib_path_abs, future in futures:
+                    records, lib_block_codes_existing, lib_pending = future.result()
+                    lib_visit[lib_path_abs].update(lib_block_codes_existing)
+                    lib_all.extend(lib_pending)
+                    yield from records
+
     # ------------------------------------------------------------------------
     # Direct filepaths from Blocks
     #
@@ -633,23 +1171,87 @@ class FilePath:
 
 class bf_utils:
     @staticmethod
-    def iter_ListBase(block, next_item=b'next'):
+    def _iter_ListBase_values(block, next_item, path, sdna_index_refine):
+        """
+        Yield (item, value) for each item in the list, where value is ``item.get(path)`` (or None without a path).
+
+        Field offsets are only looked up once per struct & pointers are read directly,
+        without :meth:`blendfile.BlendFileBlock.get`.
+        """
+        if not block:
+            return
+
+        bfile = block.file
+        header = bfile.header
+        # read through 'read_at' when there are edits to apply.
+        data = bfile.data if not bfile.edits else None
+        read_at = bfile.read_at
+        find_block_from_offset = bfile.find_block_from_offset
+
+        if path is not None and sdna_index_refine is not None:
+            struct_refine = bfile.structs[sdna_index_refine]
+            accessor_value = struct_refine.field_accessor_from_path(header, path)
+            if accessor_value is None:
+                raise KeyError("%r not found in %r (%r)" %
+                        (path, [f.dna_name.name_only for f in struct_refine.fields], struct_refine.dna_type_id))
+        else:
+            accessor_value = None
+
+        # {sdna_index: (accessor_next, accessor_value)}, normally all items use the same struct.
+        accessors = {}
+
         while block:
-            yield block
-            block = block.file.find_block_from_offset(block[next_item])
+            accessor_pair = accessors.get(block.sdna_index)
+            if accessor_pair is None:
+                dna_type = block.dna_type
+                accessor_next = dna_type.field_accessor_from_path(header, next_item)
+                if accessor_next is None:
+                    # raises the same exception as 'block[next_item]'
+                    block[next_item]
+                if sdna_index_refine is not None:
+                    bfile.ensure_subtype_smaller(block.sdna_index, sdna_index_refine)
+                elif path is not None:
+                    accessor_value = dna_type.field_accessor_from_path(header, path)
+                    if accessor_value is None:
+                        block[path]
+                accessor_pair = accessors[block.sdna_index] = (accessor_next, accessor_value)
+            accessor_next, accessor_value = accessor_pair
+
+            ofs = block.file_offset
+            if data is not None:
+                value = None if accessor_value is None else accessor_value.unpack_from(data, ofs + accessor_value.offset)
+                yield block, value
+                block = find_block_from_offset(accessor_next.unpack_from(data, ofs + accessor_next.offset))
+            else:
+                value = None if accessor_value is None else accessor_value.unpack_from(
+                        read_at(ofs + accessor_value.offset, accessor_value.size), 0)
+                yield block, value
+                block = find_block_from_offset(accessor_next.unpack_from(
+                        read_at(ofs + accessor_next.offset, accessor_next.size), 0))
 
+    @staticmethod
+    def iter_ListBase(block, next_item=b'next'):
+        for item, _ in bf_utils._iter_ListBase_values(block, next_item, None, None):
+            yield item
+
+    @staticmethod
+    def iter_ListBase_pointer(block, path, sdna_index_refine=None, next_item=b'next'):
+        """
+        Yield ``item.get_pointer(path, sdna_index_refine=sdna_index_refine)`` for each item in the list
+        (including None for null pointers),
+        the pointers are collected first, then resolved at once.
+        """
+        offsets = [value for _, value in bf_utils._iter_ListBase_values(block, next_item, path, sdna_index_refine)]
+        if offsets:
+            yield from block.file.find_blocks_from_offsets(offsets)
+
+    @staticmethod
     def iter_array(block, length=-1):
         assert(block.code == b'DATA')
-        from . import blendfile
-        import os
-        handle = block.file.handle
-        header = block.file.header
+        if length < 0:
+            return
 
-        for i in range(length):
-            block.file.handle.seek(block.file_offset + (header.pointer_size * i), os.SEEK_SET)
-            offset = blendfile.DNA_IO.read_pointer(handle, header)
-            sub_block = block.file.find_block_from_offset(offset)
-            yield sub_block
+        yield from block.file.find_blocks_from_offsets(block.get_pointer_array(length))
 
 
 # -----------------------------------------------------------------------------
@@ -739,17 +1341,18 @@ class ExpandID:
         if block_pose is not None:
             assert(block_pose.dna_type.dna_type_id == b'bPose')
             sdna_index_bPoseChannel = block_pose.file.sdna_index_from_id[b'bPoseChannel']
-            for item in bf_utils.iter_ListBase(block_pose.get_pointer((b'chanbase', b'first'))):
-                item_custom = item.get_pointer(b'custom', sdna_index_refine=sdna_index_bPoseChannel)
+            for item_custom in bf_utils.iter_ListBase_pointer(
+                    block_pose.get_pointer((b'chanbase', b'first')), b'custom',
+                    sdna_index_refine=sdna_index_bPoseChannel):
                 if item_custom is not None:
                     yield item_custom
         # Expand the objects 'ParticleSettings' via:
         # 'ob->particlesystem[...].part'
         sdna_index_ParticleSystem = block.file.sdna_index_from_id.get(b'ParticleSystem')
         if sdna_index_ParticleSystem is not None:
-            for item in bf_utils.iter_ListBase(
-                    block.get_pointer((b'particlesystem', b'first'))):
-                item_part = item.get_pointer(b'part', sdna_index_refine=sdna_index_ParticleSystem)
+            for item_part in bf_utils.iter_ListBase_pointer(
+                    block.get_pointer((b'particlesystem', b'first')), b'part',
+                    sdna_index_refine=sdna_index_ParticleSystem):
                 if item_part is not None:
                     yield item_part
 
@@ -836,8 +1439,8 @@ class ExpandID:
         yield block.get_pointer(b'clip', None)
 
         sdna_index_Base = block.file.sdna_index_from_id[b'Base']
-        for item in bf_utils.iter_ListBase(block.get_pointer((b'base', b'first'))):
-            yield item.get_pointer(b'object', sdna_index_refine=sdna_index_Base)
+        yield from bf_utils.iter_ListBase_pointer(
+                block.get_pointer((b'base', b'first')), b'object', sdna_index_refine=sdna_index_Base)
 
         block_ed = block.get_pointer(b'ed')
         if block_ed is not None:
@@ -868,8 +1471,8 @@ class ExpandID:
     @staticmethod
     def expand_GR(block):  # 'Group'
         sdna_index_GroupObject = block.file.sdna_index_from_id[b'GroupObject']
-        for item in bf_utils.iter_ListBase(block.get_pointer((b'gobject', b'first'))):
-            yield item.get_pointer(b'ob', sdna_index_refine=sdna_index_GroupObject)
+        yield from bf_utils.iter_ListBase_pointer(
+                block.get_pointer((b'gobject', b'first')), b'ob', sdna_index_refine=sdna_index_GroupObject)
 
     # expand_GR --> {b'GR': expand_GR, ...}
     expand_funcs = {
@@ -878,6 +1481,64 @@ class ExpandID:
         if k.startswith("expand_")
         }
 
+    # ID codes each expand function may yield (besides linked ID's),
+    # keep in sync with the functions above.
+    expand_codes = {
+        b'OB': {b'AC', b'MA', b'GR', b'OB', b'CL', b'PA'},
+        b'ME': {b'AC', b'MA', b'ME'},
+        b'CU': {b'AC', b'MA', b'VF', b'OB'},
+        b'MB': {b'AC', b'MA'},
+        b'AR': {b'AC'},
+        b'LA': {b'AC', b'TE', b'OB'},
+        b'MA': {b'AC', b'TE', b'OB', b'GR'},
+        b'TE': {b'AC', b'IM'},
+        b'WO': {b'AC', b'TE', b'OB'},
+        b'NT': {b'AC'},
+        b'PA': {b'AC', b'GR', b'OB', b'TE'},
+        b'SC': {b'AC', b'OB', b'WO', b'SC', b'MC', b'MS', b'SO'},
+        b'GR': {b'OB'},
+        }
+    # expand functions which may yield an ID of any type
+    # (object data & the ID's used by nodes).
+    expand_codes_any = {b'OB', b'NT', b'LA', b'MA', b'TE', b'WO', b'SC'}
+
+    @staticmethod
+    def expand(block):
+        """
+        Return the ID blocks used by ``block`` (a tuple).
+
+        Results are cached in the blend file, so ID's used by many others are only expanded once
+        (also for files visited again from a :class:`blendfile.BlendFilePool`).
+        """
+        id_expand_cache = block.file.id_expand_cache
+        sub_blocks = id_expand_cache.get(block.addr_old)
+        if sub_blocks is None:
+            fn = ExpandID.expand_funcs.get(block.code)
+            if fn is None:
+                sub_blocks = ()
+            else:
+                sub_blocks = tuple(sub_block for sub_block in fn(block) if sub_block is not None)
+            id_expand_cache[block.addr_old] = sub_blocks
+        return sub_blocks
+
+    @staticmethod
+    def expand_codes_reach(codes):
+        """
+        Return the ID codes which may lead to any of ``codes`` when expanded (including ``codes``).
+        """
+        codes_reach = set(codes)
+        codes_any = ExpandID.expand_codes_any
+        codes_expand = ExpandID.expand_codes
+        is_changed = True
+        while is_changed:
+            is_changed = False
+            for code, codes_sub in codes_expand.items():
+                if code not in codes_reach:
+                    if (code in codes_any) or (not codes_sub.isdisjoint(codes_reach)):
+                        codes_reach.add(code)
+                        is_changed = True
+        return codes_reach
+
 
 # -----------------------------------------------------------------------------
 # Packing Utility
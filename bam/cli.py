@@ -104,6 +104,25 @@ class bam_config:
 
         return path[:-(len(test_subpath) + 1)]
 
+    @staticmethod
+    def deps_cache_open(cwd=None):
+        """
+        Return the dependency cache stored in the project
+        (or None when not in a project, or the cache can't be opened).
+        """
+        basedir = bam_config.find_basedir(cwd=cwd)
+        if basedir is None:
+            return None
+
+        import sqlite3
+        from bam.blend.blendfile_path_walker import FilePathCache
+        try:
+            return FilePathCache.from_basedir(basedir)
+        except (sqlite3.Error, OSError) as ex:
+            # read-only or shared project directories, continue without a cache.
+            log.info("Dependency cache not used, %s" % ex)
+            return None
+
     def find_sessiondir(cwd=None, abort=False):
         """
         from:  my_project/my_session/some/subdir
@@ -917,7 +936,7 @@ class bam_commands:
 
     @staticmethod
     def commit(paths, message):
-        from bam.utils.system import write_json_to_file, write_json_to_zip
+        from bam.utils.system import write_json_to_file, write_json_to_zip, is_compressed_file
         import requests
 
         # Load project configuration
@@ -1066,7 +1085,10 @@ class bam_commands:
             for paths_dict, op in ((paths_modified, 'M'), (paths_add, 'A')):
                 for (f_rel, f_abs) in paths_dict.items():
                     print("  packing (%s): %r" % (op, f_abs))
-                    zip_handle.write(f_abs, arcname=f_rel)
+                    zip_handle.write(
+                            f_abs, arcname=f_rel,
+                            compress_type=zipfile.ZIP_STORED if is_compressed_file(f_abs) else zipfile.ZIP_DEFLATED,
+                            )
 
             # make a paths remap that only includes modified files
             # TODO(cam), from 'packer.py'
@@ -1277,17 +1299,50 @@ class bam_commands:
                     print("  %s" % (strip_dot_slash(name_full) if use_full else name_short))
 
     @staticmethod
-    def deps(paths, recursive=False, use_json=False):
+    def deps(paths, recursive=False, use_json=False, jobs=1, path_codes=None):
+
+        if jobs != 1 and not recursive:
+            # only libraries are visited in parallel
+            fatal("--jobs is only supported with --recursive")
+
+        if path_codes is not None:
+            from bam.blend import blendfile_path_walker
+            path_codes = {code.strip().upper().encode('ascii') for code in path_codes.split(",") if code.strip()}
+            path_codes_unknown = path_codes - set(blendfile_path_walker.FilePath._from_block_dict.keys())
+            if path_codes_unknown:
+                fatal("Unknown type(s) %s, expected from: %s" % (
+                    ", ".join(sorted(code.decode('ascii') for code in path_codes_unknown)),
+                    ", ".join(sorted(code.decode('ascii') for code in blendfile_path_walker.FilePath._from_block_dict.keys())),
+                    ))
+            del blendfile_path_walker
 
         def deps_path_walker():
             from bam.blend import blendfile_path_walker
             for blendfile_src in paths:
+                # files which haven't changed since the last run aren't read again
+                cache = bam_config.deps_cache_open(cwd=os.path.dirname(os.path.abspath(blendfile_src)))
                 blendfile_src = blendfile_src.encode('utf-8')
-                yield from blendfile_path_walker.FilePath.visit_from_blend(
-                        blendfile_src,
-                        readonly=True,
-                        recursive=recursive,
-                        )
+                try:
+                    if recursive and jobs != 1:
+                        # libraries are visited by worker processes
+                        yield from blendfile_path_walker.FilePath.visit_from_blend_parallel(
+                                blendfile_src,
+                                recursive=recursive,
+                                path_codes=path_codes,
+                                jobs=jobs or None,
+                                cache=cache,
+                                )
+                    else:
+                        yield from blendfile_path_walker.FilePath.visit_from_blend(
+                                blendfile_src,
+                                readonly=True,
+                                recursive=recursive,
+                                path_codes=path_codes,
+                                cache=cache,
+                                )
+                finally:
+                    if cache is not None:
+                        cache.close()
 
         def status_walker():
             for fp, (rootdir, fp_blend_basename) in deps_path_walker():
@@ -1320,6 +1375,72 @@ class bam_commands:
             for f_src, f_dst, f_dst_abs, f_status in status_walker():
                 print("  %r -> (%r = %r) %s" % (f_src, f_dst, f_dst_abs, f_status))
 
+    @staticmethod
+    def rdeps(paths, recursive=False, use_json=False, dirs=None):
+        import sqlite3
+        from bam.blend import blendfile_path_index
+
+        # the index is kept in the project, otherwise it's only used for this command
+        basedir = bam_config.find_basedir()
+        if dirs:
+            rootdirs = [os.path.abspath(d) for d in dirs]
+            for rootdir in rootdirs:
+                if not os.path.isdir(rootdir):
+                    fatal("Expected a directory (%r)" % rootdir)
+        elif basedir is not None:
+            rootdirs = [os.path.dirname(basedir)]
+        else:
+            fatal("Not a bam project, pass the directories to search for blend files with --dir")
+
+        index = None
+        if basedir is not None:
+            try:
+                index = blendfile_path_index.FilePathIndex.from_basedir(basedir)
+                for rootdir in rootdirs:
+                    index.update(rootdir.encode('utf-8'))
+            except (sqlite3.Error, OSError) as ex:
+                # read-only or shared project directories, index for this command only.
+                log.info("Dependency index not used, %s" % ex)
+                if index is not None:
+                    index.close()
+                index = None
+        if index is None:
+            index = blendfile_path_index.FilePathIndex(":memory:")
+            for rootdir in rootdirs:
+                index.update(rootdir.encode('utf-8'))
+
+        with index:
+
+            def status_walker():
+                for path in paths:
+                    for blend, f_ref, code, level in index.rdeps(path.encode('utf-8'), recursive=recursive):
+                        yield (
+                            # filepath-src
+                            path,
+                            # blendfile-dst
+                            blend.decode('utf-8'),
+                            # filepath referenced by the blend (path or a library using it)
+                            f_ref.decode('utf-8'),
+                            code.decode('utf-8'),
+                            level,
+                            )
+
+            if use_json:
+                is_first = True
+                # print in parts, so we don't block the output
+                print("[")
+                for item in status_walker():
+                    if is_first:
+                        is_first = False
+                    else:
+                        print(",")
+
+                    print(json.dumps(item), end="")
+                print("]")
+            else:
+                for f_src, f_blend, f_ref, code, level in status_walker():
+                    print("  %r <- %r (%s %r, level %d)" % (f_src, f_blend, code, f_ref, level))
+
     @staticmethod
     def pack(
             paths,
@@ -1331,6 +1452,7 @@ class bam_commands:
             warn_remap_externals=False,
             compress_level=-1,
             filename_filter=None,
+            jobs=1,
             ):
         # Local packing (don't use any project/session stuff)
         from .blend import blendfile_pack
@@ -1370,6 +1492,7 @@ class bam_commands:
                 warn_remap_externals=warn_remap_externals,
                 use_variations=True,
                 filename_filter=filename_filter_cb,
+                jobs=jobs or None,
                 ):
             pass
 
@@ -1381,6 +1504,7 @@ class bam_commands:
             all_deps=False,
             use_quiet=False,
             filename_filter=None,
+            jobs=1,
             ):
         # Local packing (don't use any project/session stuff)
         from .blend import blendfile_copy
@@ -1420,15 +1544,22 @@ class bam_commands:
             del compiled_pattern
             del re, fnmatch
 
-        for msg in blendfile_copy.copy_paths(
-                [path.encode('utf-8') for path in paths],
-                output.encode('utf-8'),
-                base.encode('utf-8'),
-                all_deps=all_deps,
-                report=report,
-                filename_filter=filename_filter,
-                ):
-            pass
+        cache = bam_config.deps_cache_open(cwd=base)
+        try:
+            for msg in blendfile_copy.copy_paths(
+                    [path.encode('utf-8') for path in paths],
+                    output.encode('utf-8'),
+                    base.encode('utf-8'),
+                    all_deps=all_deps,
+                    report=report,
+                    filename_filter=filename_filter,
+                    cache=cache,
+                    jobs=jobs or None,
+                    ):
+                pass
+        finally:
+            if cache is not None:
+                cache.close()
 
     @staticmethod
     def remap_start(
@@ -1446,10 +1577,16 @@ class bam_commands:
             fatal("Remap in progress, run with 'finish' or remove %r" % filepath_remap)
 
         from bam.blend import blendfile_path_remap
-        remap_data = blendfile_path_remap.start(
-                paths,
-                use_json=use_json,
-                )
+        cache = bam_config.deps_cache_open()
+        try:
+            remap_data = blendfile_path_remap.start(
+                    paths,
+                    use_json=use_json,
+                    cache=cache,
+                    )
+        finally:
+            if cache is not None:
+                cache.close()
 
         with open(filepath_remap, 'wb') as fh:
             import pickle
@@ -1511,6 +1648,7 @@ def init_argparse_common(
         use_quiet=False,
         use_compress_level=False,
         use_exclude=False,
+        use_jobs=False,
         ):
     import argparse
 
@@ -1554,6 +1692,11 @@ def init_argparse_common(
                 ``--exclude="*.txt;*.avi;*.wav"``
                 """
                 )
+    if use_jobs:
+        subparse.add_argument(
+                "--jobs", dest="jobs", type=int, default=1, metavar='N',
+                help="Number of processes (or threads) to use (0 for one per CPU)",
+                )
 
 
 def create_argparse_init(subparsers):
@@ -1717,14 +1860,55 @@ def create_argparse_deps(subparsers):
             "-r", "--recursive", dest="recursive", action='store_true',
             help="Scan dependencies recursively",
             )
+    subparse.add_argument(
+            "-t", "--type", dest="path_codes", metavar='CODES', default=None,
+            help="Only list paths from these ID types, comma separated (IM, LI, MC, SO, VF, ME, OB, SC, CL, CF)",
+            )
 
     init_argparse_common(subparse, use_json=True)
+    subparse.add_argument(
+            "--jobs", dest="jobs", type=int, default=1, metavar='N',
+            help="Number of processes to visit libraries with (0 for one per CPU), requires --recursive",
+            )
 
     subparse.set_defaults(
             func=lambda args:
             bam_commands.deps(
                     args.paths, args.recursive,
-                    use_json=args.json),
+                    use_json=args.json,
+                    jobs=args.jobs,
+                    path_codes=args.path_codes),
+                    )
+
+
+def create_argparse_rdeps(subparsers):
+    subparse = subparsers.add_parser(
+            "rdeps", aliases=("rd",),
+            help="List blend files in the project which depend on file(s)",
+            )
+    subparse.add_argument(
+            dest="paths", nargs="+",
+            help="Path(s) to operate on",
+            )
+    subparse.add_argument(
+            "-r", "--recursive", dest="recursive", action='store_true',
+            help="Include blend files depending on the path(s) through libraries",
+            )
+
+    subparse.add_argument(
+            "-d", "--dir", dest="dirs", metavar='DIR', action='append', default=None,
+            help="Directory to search for blend files, may be passed multiple times "
+                 "(defaults to the whole project, required outside a project)",
+            )
+
+    init_argparse_common(subparse, use_json=True)
+
+    subparse.set_defaults(
+            func=lambda args:
+            bam_commands.rdeps(
+                    args.paths, args.recursive,
+                    use_json=args.json,
+                    dirs=args.dirs),
                     )
 
 
@@ -1785,7 +1969,8 @@ def create_argparse_pack(subparsers):
             help="Warn for every dependency outside of given repository base path",
             )
 
-    init_argparse_common(subparse, use_all_deps=True, use_quiet=True, use_compress_level=True, use_exclude=True)
+    init_argparse_common(
+            subparse, use_all_deps=True, use_quiet=True, use_compress_level=True, use_exclude=True, use_jobs=True)
 
     subparse.set_defaults(
             func=lambda args:
@@ -1801,6 +1986,7 @@ def create_argparse_pack(subparsers):
                     warn_remap_externals=args.warn_remap_externals,
                     compress_level=args.compress_level,
                     filename_filter=args.exclude,
+                    jobs=args.jobs,
                     ),
             )
 
@@ -1838,7 +2024,7 @@ def create_argparse_copy(subparsers):
             help="Base directory for input paths (files outside this path will be omitted)",
             )
 
-    init_argparse_common(subparse, use_all_deps=True, use_quiet=True, use_exclude=True)
+    init_argparse_common(subparse, use_all_deps=True, use_quiet=True, use_exclude=True, use_jobs=True)
 
     subparse.set_defaults(
             func=lambda args:
@@ -1849,6 +2035,7 @@ def create_argparse_copy(subparsers):
                     all_deps=args.all_deps,
                     use_quiet=args.use_quiet,
                     filename_filter=args.exclude,
+                    jobs=args.jobs,
                     ),
             )
 
@@ -1987,6 +2174,7 @@ def create_argparse():
 
     # non-bam project commands
     create_argparse_deps(subparsers)
+    create_argparse_rdeps(subparsers)
     create_argparse_pack(subparsers)
     create_argparse_copy(subparsers)
     create_argparse_remap(subparsers)
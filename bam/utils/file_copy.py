@@ -0,0 +1,165 @@
+# ***** BEGIN GPL LICENSE BLOCK *****
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+# ***** END GPL LICENCE BLOCK *****
+
+"""
+Copy files using the fastest method the file-system supports, many files at once.
+"""
+
+import errno
+import os
+import shutil
+import sys
+
+FILE_BUFFER_SIZE = 1024 * 1024
+
+# linux/fs.h, _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+# errors where a method isn't supported (for these files), the next method is tried.
+_ERRNO_UNSUPPORTED = {
+    errno.EXDEV,
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.ENOTTY,
+    errno.EOPNOTSUPP,
+    errno.EBADF,
+    errno.EPERM,
+    }
+
+
+def _copy_reflink(f_src, f_dst):
+    """
+    Share the data of both files (copy-on-write), on file-systems which support it (btrfs, XFS ...).
+    """
+    import fcntl
+    try:
+        fcntl.ioctl(f_dst.fileno(), FICLONE, f_src.fileno())
+    except OSError as ex:
+        if ex.errno in _ERRNO_UNSUPPORTED:
+            return False
+        raise
+    return True
+
+
+def _copy_file_range(f_src, f_dst, size):
+    """
+    Copy in the kernel (no copy to user space), returns the number of bytes copied
+    (less than ``size`` when not supported).
+    """
+    fd_src = f_src.fileno()
+    fd_dst = f_dst.fileno()
+    offset = 0
+    while offset < size:
+        try:
+            copied = os.copy_file_range(fd_src, fd_dst, size - offset, offset, offset)
+        except OSError as ex:
+            if ex.errno in _ERRNO_UNSUPPORTED:
+                break
+            raise
+        if copied == 0:
+            break
+        offset += copied
+    return offset
+
+
+def copy_file(path_src, path_dst):
+    """
+    Copy the data & permission bits of a file (same as :func:`shutil.copy`, ``path_dst`` must be a file).
+
+    Returns the method used: ``'reflink'``, ``'copy_file_range'`` or ``'buffered'``.
+    """
+    with open(path_src, 'rb') as f_src, open(path_dst, 'wb') as f_dst:
+        method = 'buffered'
+        offset = 0
+        if sys.platform.startswith("linux"):
+            if _copy_reflink(f_src, f_dst):
+                method = 'reflink'
+            elif hasattr(os, "copy_file_range"):
+                size = os.fstat(f_src.fileno()).st_size
+                offset = _copy_file_range(f_src, f_dst, size)
+                if offset != 0:
+                    method = 'copy_file_range'
+
+        if method != 'reflink':
+            # the rest of the file (files may grow while copying).
+            f_src.seek(offset, os.SEEK_SET)
+            f_dst.seek(offset, os.SEEK_SET)
+            shutil.copyfileobj(f_src, f_dst, FILE_BUFFER_SIZE)
+    shutil.copymode(path_src, path_dst)
+    return method
+
+
+def _copy_file_timed(path_src, path_dst):
+    import time
+    time_start = time.perf_counter()
+    method = copy_file(path_src, path_dst)
+    return os.path.getsize(path_dst), time.perf_counter() - time_start, method
+
+
+def copy_files(paths_src_dst, jobs=1):
+    """
+    Copy files using ``jobs`` threads (None for one per CPU), see :func:`copy_file`.
+    Destination directories must exist.
+
+    Takes [(path_src, path_dst), ...] and yields (path_src, path_dst, size, time, method)
+    once each file is copied (in the same order).
+    """
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+
+    if jobs == 1:
+        for path_src, path_dst in paths_src_dst:
+            yield (path_src, path_dst) + _copy_file_timed(path_src, path_dst)
+        return
+
+    import collections
+    import concurrent.futures
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        pending = collections.deque()
+        try:
+            for path_src, path_dst in paths_src_dst:
+                # bound the number of files copied ahead of the results
+                if len(pending) >= jobs * 2:
+                    path_src_done, path_dst_done, future = pending.popleft()
+                    yield (path_src_done, path_dst_done) + future.result()
+                pending.append((path_src, path_dst, executor.submit(_copy_file_timed, path_src, path_dst)))
+            while pending:
+                path_src_done, path_dst_done, future = pending.popleft()
+                yield (path_src_done, path_dst_done) + future.result()
+        finally:
+            for path_src, path_dst, future in pending:
+                future.cancel()
+
+
+def throughput_as_str(size, time):
+    """
+    Return the size & throughput of a copy as a string, eg: ``'12.5 MiB, 310.2 MiB/s'``.
+    """
+    def size_as_str(size):
+        for unit in ("B", "KiB", "MiB", "GiB"):
+            if size < 1024.0:
+                break
+            size /= 1024.0
+        else:
+            unit = "TiB"
+        return ("%d %s" % (size, unit)) if unit == "B" else ("%.1f %s" % (size, unit))
+
+    if time <= 0.0:
+        return size_as_str(size)
+    return "%s, %s/s" % (size_as_str(size), size_as_str(size / time))
@@ -72,6 +72,38 @@ def uuid_from_file(fn, block_size=1 << 20):
         return hex(size)[2:] + sha1.hexdigest()
 
 
+class UUIDWriter:
+    """
+    File object for writing, calculates the same value as :func:`uuid_from_file`
+    for the data written, which is passed on to ``handle`` (when not None).
+    """
+    __slots__ = (
+        "handle",
+        "size",
+        "sha",
+        )
+
+    def __init__(self, handle=None):
+        import hashlib
+        self.handle = handle
+        self.size = 0
+        self.sha = hashlib.new('sha512')
+
+    def write(self, data):
+        if self.handle is not None:
+            self.handle.write(data)
+        self.size += len(data)
+        self.sha.update(data)
+        return len(data)
+
+    def flush(self):
+        if self.handle is not None:
+            self.handle.flush()
+
+    def uuid(self):
+        return hex(self.size)[2:] + self.sha.hexdigest()
+
+
 def write_json_to_zip(zip_handle, path, data=None):
     import json
     zip_handle.writestr(
@@ -95,36 +127,85 @@ def write_json_to_file(path, data):
                 )
 
 
-def is_compressed_filetype(filepath):
+# (offset, magic) of file formats which are compressed, see 'is_compressed_file'
+COMPRESSED_FILE_MAGIC = (
+    # archives
+    (0, b'\x1f\x8b'),  # gzip (including compressed blend files)
+    (0, b'PK\x03\x04'),  # zip
+    (0, b'BZh'),  # bzip2
+    (0, b'\xfd7zXZ\x00'),  # xz
+    (0, b'\x28\xb5\x2f\xfd'),  # zstd
+    (0, b'7z\xbc\xaf\x27\x1c'),  # 7z
+
+    # images
+    (0, b'\x89PNG\r\n\x1a\n'),
+    (0, b'\xff\xd8\xff'),  # jpeg
+    (0, b'GIF8'),
+    (8, b'WEBP'),
+
+    # audio & video
+    (0, b'OggS'),
+    (0, b'fLaC'),
+    (0, b'ID3'),  # mp3
+    (0, b'\x1a\x45\xdf\xa3'),  # matroska, webm
+    (4, b'ftyp'),  # mp4, mov
+    )
+
+
+# {(filepath, size, mtime_ns, inode): bool}, see 'is_compressed_file'
+_is_compressed_file_cache = {}
+IS_COMPRESSED_FILE_CACHE_SIZE = 4096
+
+
+def is_compressed_file(filepath, sample_size=64 * 1024, sample_count=4, ratio_max=0.95):
     """
-    Use to check if we should compress files in a zip.
+    Use to check if we should compress a file in a zip (based on its contents, not the file extension).
+
+    Files starting with the signature of a compressed format (see :data:`COMPRESSED_FILE_MAGIC`) are compressed,
+    otherwise samples spread over the file are compressed, when they don't get smaller than ``ratio_max``
+    the file is considered compressed (compressing it again isn't worth the time).
+
+    The result is cached until the file changes (size, modification time or inode).
     """
-    # for now, only include files which Blender is likely to reference
     import os
-    assert(isinstance(filepath, bytes))
-    return os.path.splitext(filepath)[1].lower() in {
-        # images
-        b'.exr',
-        b'.jpg', b'.jpeg',
-        b'.png',
-
-        # audio
-        b'.aif', b'.aiff',
-        b'.mp3',
-        b'.ogg', b'.ogv',
-        b'.wav',
-
-        # video
-        b'.avi',
-        b'.mkv',
-        b'.mov',
-        b'.mpg', b'.mpeg',
-
-        # archives
-        # '.bz2', '.tbz',
-        # '.gz', '.tgz',
-        # '.zip',
-        }
+    import zlib
+
+    st = os.stat(filepath)
+    key = (filepath, st.st_size, st.st_mtime_ns, st.st_ino)
+    result = _is_compressed_file_cache.get(key)
+    if result is not None:
+        return result
+
+    size = st.st_size
+    if size <= sample_size * sample_count:
+        # test the whole file
+        offsets = range(0, size, sample_size)
+    else:
+        # first & last samples at the start & end of the file.
+        step = (size - sample_size) // (sample_count - 1)
+        offsets = [step * i for i in range(sample_count)]
+
+    size_sample = 0
+    size_sample_compressed = 0
+    with open(filepath, 'rb') as f:
+        magic = f.read(16)
+        if any(magic.startswith(m, offset) for offset, m in COMPRESSED_FILE_MAGIC):
+            result = True
+        else:
+            for offset in offsets:
+                f.seek(offset, os.SEEK_SET)
+                data = f.read(sample_size)
+                size_sample += len(data)
+                # fastest level, this only estimates how well the data compresses.
+                size_sample_compressed += len(zlib.compress(data, 1))
+
+            result = size_sample_compressed > size_sample * ratio_max
+
+    if len(_is_compressed_file_cache) >= IS_COMPRESSED_FILE_CACHE_SIZE:
+        # remove the oldest item
+        del _is_compressed_file_cache[next(iter(_is_compressed_file_cache))]
+    _is_compressed_file_cache[key] = result
+    return result
 
 
 def is_subdir(path, directory):
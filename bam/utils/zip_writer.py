@@ -0,0 +1,321 @@
+# ***** BEGIN GPL LICENSE BLOCK *****
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+# ***** END GPL LICENCE BLOCK *****
+
+"""
+Write members of a zip archive, compressing them in parallel.
+"""
+
+import logging
+import os
+import shutil
+import zipfile
+import zlib
+
+log = logging.getLogger("zip_writer")
+
+FILE_BUFFER_SIZE = 1024 * 1024
+
+# compressed members larger than this are written to a temp file while waiting to be added.
+SPOOL_SIZE_MAX = 64 * 1024 * 1024
+# limit for all compressed members kept in memory while waiting to be added,
+# members are written to temp files sooner when many jobs are used.
+SPOOL_MEMORY_MAX = 256 * 1024 * 1024
+
+# Members compressed by ZipWriter are added using attributes of 'zipfile.ZipFile'
+# which aren't part of its public API (see '_zipfile_append_begin' & '_zipfile_append_end'),
+# these are the same since Python 3.6 (used by 'ZipFile.open' for writing).
+# When any are missing, members are written using 'ZipFile.open' instead (without parallel compression).
+_ZIPFILE_ATTRS = ("fp", "start_dir", "filelist", "NameToInfo", "_didModify", "_writing")
+
+
+def _zipfile_is_supported(zip_handle):
+    return all(hasattr(zip_handle, attr) for attr in _ZIPFILE_ATTRS)
+
+
+def _zipfile_append_begin(zip_handle, zip_info, is_seekable):
+    """
+    Prepare to write a member (its local header & data) at the end of the archive,
+    returns the file object to write to.
+    """
+    if zip_handle._writing:
+        raise ValueError("Can't write to the ZIP file while there is an open writing handle")
+    if zip_info.filename in zip_handle.NameToInfo:
+        raise ValueError("Duplicate name: %r" % zip_info.filename)
+    fp = zip_handle.fp
+    if is_seekable:
+        fp.seek(zip_handle.start_dir, os.SEEK_SET)
+    zip_info.header_offset = fp.tell()
+    # so the central directory is written on close
+    zip_handle._didModify = True
+    return fp
+
+
+def _zipfile_append_end(zip_handle, zip_info):
+    """
+    Add a member written after :func:`_zipfile_append_begin` to the archive.
+    """
+    zip_handle.start_dir = zip_handle.fp.tell()
+    zip_handle.filelist.append(zip_info)
+    zip_handle.NameToInfo[zip_info.filename] = zip_info
+
+
+class _ZipMemberWriter:
+    """
+    File object for writing the data of a zip member,
+    compressing it to ``handle`` and calculating the CRC & sizes.
+    """
+    __slots__ = (
+        # file object (compressed data is written here)
+        "handle",
+        # zlib.Compress or None (when stored)
+        "compressor",
+        # int
+        "crc",
+        # int (uncompressed)
+        "file_size",
+        # int
+        "compress_size",
+        )
+
+    def __init__(self, handle, compress_type, compress_level):
+        self.handle = handle
+        if compress_type == zipfile.ZIP_DEFLATED:
+            # negative window bits, a raw deflate stream (as zip members use).
+            self.compressor = zlib.compressobj(compress_level, zlib.DEFLATED, -15)
+        elif compress_type == zipfile.ZIP_STORED:
+            self.compressor = None
+        else:
+            raise NotImplementedError("Compression type %r is not supported" % compress_type)
+        self.crc = 0
+        self.file_size = 0
+        self.compress_size = 0
+
+    def write(self, data):
+        size = len(data)
+        self.crc = zlib.crc32(data, self.crc)
+        self.file_size += size
+        if self.compressor is not None:
+            data = self.compressor.compress(data)
+        self.compress_size += len(data)
+        self.handle.write(data)
+        return size
+
+    def flush(self):
+        pass
+
+    def finish(self, zip_info):
+        """
+        Write the remaining data & store the CRC & sizes in ``zip_info``.
+        """
+        if self.compressor is not None:
+            data = self.compressor.flush()
+            self.compress_size += len(data)
+            self.handle.write(data)
+            self.compressor = None
+        zip_info.CRC = self.crc
+        zip_info.file_size = self.file_size
+        zip_info.compress_size = self.compress_size
+
+
+def _write_file_fn(filepath):
+    def write_fn(handle):
+        with open(filepath, 'rb') as handle_src:
+            shutil.copyfileobj(handle_src, handle, FILE_BUFFER_SIZE)
+    return write_fn
+
+
+class ZipWriter:
+    """
+    Add members to a :class:`zipfile.ZipFile` (opened for writing),
+    compressing them using a pool of threads (zlib doesn't hold the GIL while compressing).
+
+    Members are added to the archive in the order they're written (so the result doesn't depend on ``jobs``).
+    With a single job, members are compressed directly into the archive.
+
+    Use as a context manager, all members are added once it exits
+    (write to the archive directly only after that).
+
+    Compressed members waiting to be added are kept in memory (up to :data:`SPOOL_MEMORY_MAX` in total),
+    otherwise they're written to temp files.
+    """
+    __slots__ = (
+        # zipfile.ZipFile
+        "zip_handle",
+        # int, zlib compression level (-1 for the default)
+        "compress_level",
+        # int
+        "jobs",
+        # concurrent.futures.ThreadPoolExecutor or None (when 'jobs' is 1)
+        "executor",
+        # collections.deque [(ZipInfo, Future), ...] (members compressed or being compressed, in order)
+        "pending",
+        # str or None, directory used for temp files (see 'SPOOL_SIZE_MAX')
+        "temp_dir",
+        # bool, when False members are always compressed before being added
+        "is_seekable",
+        # bool, when False 'zipfile.ZipFile.open' is used to add members (see '_ZIPFILE_ATTRS')
+        "is_supported",
+        # int, the size of compressed data kept in memory for each pending member
+        "spool_size",
+        )
+
+    def __init__(self, zip_handle, compress_level=-1, jobs=1, temp_dir=None):
+        import collections
+
+        if jobs is None:
+            jobs = os.cpu_count() or 1
+        self.zip_handle = zip_handle
+        self.compress_level = compress_level
+        self.jobs = jobs
+        self.pending = collections.deque()
+        self.temp_dir = temp_dir
+        # non-seekable files are wrapped by zipfile (without a 'seekable' method).
+        seekable = getattr(zip_handle.fp, "seekable", None)
+        self.is_seekable = (seekable is not None) and seekable()
+        self.is_supported = _zipfile_is_supported(zip_handle)
+        if not self.is_supported:
+            log.warning("zipfile.ZipFile internals not found, members are compressed without threads")
+            jobs = self.jobs = 1
+        self.spool_size = min(SPOOL_SIZE_MAX, SPOOL_MEMORY_MAX // (jobs * 2))
+
+        if jobs != 1:
+            import concurrent.futures
+            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=jobs)
+        else:
+            self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # don't add members to a failed archive.
+            for zip_info, future in self.pending:
+                future.cancel()
+            if self.executor is not None:
+                self.executor.shutdown(wait=True)
+                self.executor = None
+            for zip_info, future in self.pending:
+                if not future.cancelled() and future.exception() is None:
+                    future.result().close()
+            self.pending.clear()
+
+    def close(self):
+        """
+        Add all pending members to the archive.
+        """
+        while self.pending:
+            self._append_next()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def write(self, filepath, arcname, compress_type=None):
+        """
+        Add the file ``filepath`` (see :meth:`zipfile.ZipFile.write`),
+        ``compress_type`` defaults to the compression of the archive.
+        """
+        zip_info = zipfile.ZipInfo.from_file(filepath, arcname)
+        zip_info.compress_type = self.zip_handle.compression if compress_type is None else compress_type
+        self.write_from(zip_info, _write_file_fn(filepath))
+
+    def write_from(self, zip_info, write_fn):
+        """
+        Add a member written by ``write_fn(handle)``, which runs in a worker thread
+        (``zip_info.file_size`` is used as a size hint when compressing directly into the archive).
+        """
+        if not self.is_supported:
+            self._append_open(zip_info, write_fn)
+            return
+        if self.executor is None and self.is_seekable:
+            self._append_direct(zip_info, write_fn)
+            return
+
+        # bound the number of compressed members waiting to be added.
+        while len(self.pending) >= self.jobs * 2:
+            self._append_next()
+        self.pending.append((zip_info, self._submit(self._compress, zip_info, write_fn)))
+
+    def _submit(self, fn, *args):
+        if self.executor is not None:
+            return self.executor.submit(fn, *args)
+        import concurrent.futures
+        future = concurrent.futures.Future()
+        try:
+            future.set_result(fn(*args))
+        except BaseException as ex:
+            future.set_exception(ex)
+        return future
+
+    def _compress(self, zip_info, write_fn):
+        import tempfile
+
+        handle = tempfile.SpooledTemporaryFile(max_size=self.spool_size, dir=self.temp_dir)
+        try:
+            writer = _ZipMemberWriter(handle, zip_info.compress_type, self.compress_level)
+            write_fn(writer)
+            writer.finish(zip_info)
+        except BaseException:
+            handle.close()
+            raise
+        handle.seek(0, os.SEEK_SET)
+        return handle
+
+    def _append_next(self):
+        zip_info, future = self.pending.popleft()
+        handle = future.result()
+        try:
+            fp = self._append_begin(zip_info)
+            fp.write(zip_info.FileHeader(None))
+            shutil.copyfileobj(handle, fp, FILE_BUFFER_SIZE)
+            self._append_end(zip_info)
+        finally:
+            handle.close()
+
+    def _append_direct(self, zip_info, write_fn):
+        # same as 'zipfile.ZipFile.open', write the header again once the CRC & sizes are known.
+        zip64 = zip_info.file_size * 1.05 > zipfile.ZIP64_LIMIT
+        zip_info.CRC = zip_info.compress_size = zip_info.file_size = 0
+
+        fp = self._append_begin(zip_info)
+        fp.write(zip_info.FileHeader(zip64))
+        writer = _ZipMemberWriter(fp, zip_info.compress_type, self.compress_level)
+        write_fn(writer)
+        writer.finish(zip_info)
+        if not zip64 and max(zip_info.file_size, zip_info.compress_size) > zipfile.ZIP64_LIMIT:
+            raise RuntimeError("File size too large for %r (not a ZIP64 member)" % zip_info.filename)
+
+        offset_end = fp.tell()
+        fp.seek(zip_info.header_offset, os.SEEK_SET)
+        fp.write(zip_info.FileHeader(zip64))
+        fp.seek(offset_end, os.SEEK_SET)
+        self._append_end(zip_info)
+
+    def _append_open(self, zip_info, write_fn):
+        # compressed by zipfile (using the compression level of the archive),
+        # 'zip_info.file_size' is used as a size hint too.
+        with self.zip_handle.open(zip_info, 'w') as fp:
+            write_fn(fp)
+
+    def _append_begin(self, zip_info):
+        return _zipfile_append_begin(self.zip_handle, zip_info, self.is_seekable)
+
+    def _append_end(self, zip_info):
+        _zipfile_append_end(self.zip_handle, zip_info)
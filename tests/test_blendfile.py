@@ -0,0 +1,808 @@
+#!/usr/bin/env python3
+# Apache License, Version 2.0
+
+"""
+Test reading blend files (without the bam client or server).
+
+Run all tests:
+
+   python3 test_blendfile.py
+
+Run a single test:
+
+   python3 -m unittest test_blendfile.BlendFileReadTest.test_mmap
+"""
+
+import importlib.util
+import os
+import sys
+import unittest
+
+# ------------------
+# Ensure module path
+path = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+if path not in sys.path:
+    sys.path.append(path)
+del path
+# --------
+
+BLENDS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "blends")
+
+
+def iter_blends():
+    for dirpath, dirnames, filenames in sorted(os.walk(BLENDS_DIR)):
+        for filename in sorted(filenames):
+            if filename.endswith(".blend"):
+                yield os.path.join(dirpath, filename).encode('utf-8')
+
+
+def blend_id_items(bf):
+    """
+    Return all ID blocks and their values, for comparing files read in different ways.
+    """
+    return [
+        (block.code, block.addr_old, list(block.items()))
+        for block in bf.blocks
+        if block.code not in {b'DATA', b'ENDB'}
+        ]
+
+
+class BlendFileReadTest(unittest.TestCase):
+
+    def test_mmap(self):
+        from bam.blend import blendfile
+
+        for filepath in iter_blends():
+            with blendfile.open_blend(filepath, use_mmap=False) as bf:
+                self.assertIsNone(bf.data)
+                expect = blend_id_items(bf)
+            with blendfile.open_blend(filepath, use_mmap=True) as bf:
+                if not bf.is_compressed:
+                    self.assertIsNotNone(bf.data)
+                self.assertEqual(expect, blend_id_items(bf))
+
+    def test_block_table(self):
+        from bam.blend import blendfile
+
+        for filepath in iter_blends():
+            with blendfile.open_blend(filepath) as bf:
+                self.assertEqual(bf.blocks[-1].code, b'ENDB')
+                for code in bf.code_index.keys():
+                    for block in bf.find_blocks_from_code(code):
+                        self.assertEqual(block.code, code)
+                        # blocks are only created once
+                        self.assertIs(block, bf.find_block_from_offset(block.addr_old))
+
+    def test_id_name_index(self):
+        from bam.blend import blendfile
+
+        for filepath in iter_blends():
+            with blendfile.open_blend(filepath) as bf:
+                for code in bf.code_index.keys():
+                    if len(code) != 2:
+                        continue
+                    for block in bf.find_blocks_from_code(code):
+                        id_name = block[b'name'] if code == b'ID' else block[b'id', b'name']
+                        self.assertIn(block, bf.find_blocks_from_id_name(id_name, code))
+                        self.assertIs(bf.find_blocks_from_id_name(id_name, code)[0],
+                                      bf.find_block_from_id_name(id_name, code))
+                self.assertIsNone(bf.find_block_from_id_name(b'OB__missing__'))
+
+    def test_dna_catalog_cache(self):
+        from bam.blend import blendfile
+
+        catalogs = {}
+        for filepath in iter_blends():
+            with blendfile.open_blend(filepath) as bf:
+                dna_data = bf.blocks.read_data(bf.handle, bf.data, bf.code_index[b'DNA1'][0])
+                structs_expect = blendfile.BlendFile.decode_structs(bf.header, dna_data)[0]
+                self.assertEqual(
+                        [(s.dna_type_id, s.size, [(f.dna_name.name_full, f.dna_offset) for f in s.fields])
+                         for s in structs_expect],
+                        [(s.dna_type_id, s.size, [(f.dna_name.name_full, f.dna_offset) for f in s.fields])
+                         for s in bf.structs],
+                        )
+                # identical DNA is only decoded once
+                structs = catalogs.setdefault(dna_data, bf.structs)
+                self.assertIs(structs, bf.structs)
+
+    def test_dna_catalog_cache_threads(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from unittest import mock
+        from bam.blend import blendfile
+
+        def open_structs(filepath):
+            with blendfile.open_blend(filepath) as bf:
+                dna_data = bf.blocks.read_data(bf.handle, bf.data, bf.code_index[b'DNA1'][0])
+                return dna_data, bf.structs
+
+        filepaths = list(iter_blends()) * 4
+        # evicting while other threads add catalogs
+        with mock.patch.object(blendfile, "DNA_CATALOG_CACHE_SIZE", 1), \
+             mock.patch.object(blendfile, "_dna_catalog_cache", {}):
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                self.assertEqual(len(list(executor.map(open_structs, filepaths))), len(filepaths))
+
+        # files opened at once share the same catalog
+        with mock.patch.object(blendfile, "_dna_catalog_cache", {}):
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                catalogs = {}
+                for dna_data, structs in executor.map(open_structs, filepaths):
+                    self.assertIs(catalogs.setdefault(dna_data, structs), structs)
+
+    def test_threads(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from bam.blend import blendfile
+
+        for filepath in iter_blends():
+            with blendfile.open_blend(filepath, use_mmap=False) as bf:
+                expect = {
+                    block.addr_old: (block.code, list(block.items()))
+                    for block in bf.blocks
+                    if block.code not in {b'DNA1', b'REND', b'TEST', b'GLOB', b'ENDB'}
+                    }
+            addrs_old = sorted(expect.keys()) * 2
+
+            for use_mmap in (False, True):
+                with blendfile.open_blend(filepath, use_mmap=use_mmap, codes={b'OB'}) as bf:
+                    def block_items(addr_old):
+                        block = bf.find_block_from_offset(addr_old)
+                        return (block.code, list(block.items()))
+
+                    with ThreadPoolExecutor(max_workers=8) as executor:
+                        result = list(executor.map(block_items, addrs_old))
+                    self.assertEqual(result, [expect[addr_old] for addr_old in addrs_old])
+                    # each skipped block is only read once
+                    self.assertEqual(len(bf.blocks), bf.blocks.scan_len + 1 + len(bf.blocks.lazy_block_indices))
+                    self.assertEqual(
+                            len(bf.blocks.lazy_block_indices),
+                            len(set(bf.blocks.lazy_block_indices.values())))
+
+    def test_lazy_codes(self):
+        from bam.blend import blendfile
+
+        for filepath in iter_blends():
+            with blendfile.open_blend(filepath) as bf:
+                expect = [
+                    (block.code, block.addr_old, block.file_offset, bytes(block.get_raw_data()))
+                    for block in bf.blocks[:-1]
+                    ]
+            with blendfile.open_blend(filepath, codes={b'OB'}) as bf:
+                self.assertLessEqual(set(bf.code_index.keys()), {b'OB', b'DNA1'})
+                blocks_ob = bf.find_blocks_from_code(b'OB')
+                self.assertEqual([item for item in expect if item[0] == b'OB'],
+                                 [(block.code, block.addr_old, block.file_offset, bytes(block.get_raw_data()))
+                                  for block in blocks_ob])
+                # all other blocks are read on access
+                for code, addr_old, file_offset, data in expect:
+                    if code in {b'DNA1', b'REND', b'TEST', b'GLOB'}:
+                        continue
+                    block = bf.find_block_from_offset(addr_old)
+                    self.assertEqual((code, addr_old, file_offset, data),
+                                     (block.code, block.addr_old, block.file_offset, bytes(block.get_raw_data())))
+                    self.assertIs(block, bf.find_block_from_offset(addr_old))
+
+    def test_get_array(self):
+        from bam.blend import blendfile
+
+        for filepath in iter_blends():
+            with blendfile.open_blend(filepath) as bf:
+                header = bf.header
+                for block in bf.blocks:
+                    if block.code != b'DATA' or block.count < 2:
+                        continue
+                    dna_struct = block.dna_type
+                    for field in dna_struct.fields:
+                        path = field.dna_name.name_only
+                        try:
+                            expect = [block.get(path, use_str=False, base_index=i) for i in range(block.count)]
+                        except NotImplementedError:
+                            continue
+                        self.assertEqual(expect, block.get_array(path, use_str=False))
+
+                    data = bytes(block.get_raw_data())
+                    self.assertEqual(
+                            [blendfile.DNA_IO.unpack_pointer(data, ofs, header)
+                             for ofs in range(0, block.size - header.pointer_size + 1, header.pointer_size)],
+                            block.get_pointer_array().tolist())
+
+    @unittest.skipIf(importlib.util.find_spec("numpy") is None, "NumPy not installed")
+    def test_as_numpy(self):
+        from bam.blend import blendfile
+
+        for filepath in iter_blends():
+            with blendfile.open_blend(filepath) as bf:
+                for block in bf.find_blocks_from_code(b'OB'):
+                    values = block.as_numpy()
+                    self.assertEqual(len(values), block.count)
+                    self.assertEqual(values[0]['id']['name'].partition(b'\0')[0], block[b'id', b'name'])
+                    self.assertEqual(values[0]['data'], block[b'data'])
+                    del values
+
+    def test_data_hash(self):
+        import shutil
+        import tempfile
+        from bam.blend import blendfile
+
+        filepath = os.path.join(BLENDS_DIR, "variations", "cone.blend").encode('utf-8')
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filepath_temp = os.path.join(temp_dir.encode('utf-8'), b"test.blend")
+            shutil.copy(filepath, filepath_temp)
+
+            with blendfile.open_blend(filepath_temp) as bf:
+                hashes = bf.get_data_hashes()
+                self.assertEqual(hashes, [block.get_data_hash() for block in bf.blocks])
+                block = bf.find_blocks_from_code(b'OB')[0]
+                block_index = bf.blocks.file_offsets.index(block.file_offset)
+                ofs_pointer = block.get_file_offset(b'data')[0]
+                ofs_name = block.file_offset + block.dna_type.field_offset_from_path(bf.header, (b'id', b'name'))[1]
+
+            # pointers don't change the hash
+            with open(filepath_temp, 'r+b') as f:
+                f.seek(ofs_pointer)
+                f.write(b'\xff' * 4)
+            with blendfile.open_blend(filepath_temp) as bf:
+                self.assertEqual(hashes, bf.get_data_hashes())
+
+            # other data does
+            with open(filepath_temp, 'r+b') as f:
+                f.seek(ofs_name + 2)
+                f.write(b'X')
+            with blendfile.open_blend(filepath_temp) as bf:
+                hashes_new = bf.get_data_hashes()
+                self.assertNotEqual(hashes[block_index], hashes_new[block_index])
+                del hashes_new[block_index], hashes[block_index]
+                self.assertEqual(hashes, hashes_new)
+
+            # raw data (without a DNA struct) isn't masked
+            with blendfile.open_blend(filepath_temp) as bf:
+                hashes = bf.get_data_hashes()
+                block = [
+                    block for block in bf.blocks
+                    if block.code == b'DATA' and block.sdna_index == 0 and block.size >= bf.structs[0].size
+                    ][0]
+                block_index = bf.blocks.file_offsets.index(block.file_offset)
+                data = bytes(block.get_raw_data())
+            with open(filepath_temp, 'r+b') as f:
+                f.seek(block.file_offset)
+                f.write(bytes((data[0] ^ 0xff,)))
+            with blendfile.open_blend(filepath_temp) as bf:
+                self.assertNotEqual(hashes[block_index], bf.blocks[block_index].get_data_hash())
+
+    def test_items_decoder(self):
+        from bam.blend import blendfile
+
+        for filepath in iter_blends():
+            with blendfile.open_blend(filepath) as bf:
+                for block in bf.blocks:
+                    if block.code == b'ENDB':
+                        continue
+                    expect = []
+                    for k in block.keys():
+                        try:
+                            expect.append((k, block[k]))
+                        except NotImplementedError as ex:
+                            expect.append((k, "<%s>" % ex.args[2].dna_type_id.decode('ascii')))
+                    self.assertEqual(expect, list(block.items()))
+                    self.assertEqual([v for k, v in expect], list(block.values()))
+
+                    expect = []
+                    for k in block.keys():
+                        expect.extend(block.get_recursive_iter(k, use_str=False))
+                    self.assertEqual(expect, list(block.items_recursive_iter()))
+
+    def test_pool(self):
+        import shutil
+        import tempfile
+        from bam.blend import blendfile
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filepath = os.path.join(temp_dir.encode('utf-8'), b"test.blend")
+            shutil.copy(os.path.join(BLENDS_DIR, "variations", "cone.blend").encode('utf-8'), filepath)
+
+            with blendfile.BlendFilePool(files_max=1) as pool:
+                with pool.open(filepath) as bf:
+                    bf_prev = bf
+                with pool.open(filepath) as bf:
+                    self.assertIs(bf, bf_prev)
+                    with pool.open(filepath, codes={b'OB'}) as bf_codes:
+                        self.assertIsNot(bf, bf_codes)
+                        self.assertEqual(len(pool.files), 2)
+                    # over the limit, files in use are kept
+                    self.assertEqual([item[0] for item in pool.files.values()], [bf])
+
+                # files are only shared by users of the same edits
+                edits_a = blendfile.BlendFileEdits()
+                edits_b = blendfile.BlendFileEdits()
+                with pool.open(filepath, edits=edits_a) as bf_a:
+                    self.assertIs(bf_a, bf_prev)
+                    with pool.open(filepath, edits=edits_a) as bf:
+                        self.assertIs(bf, bf_a)
+                    self.assertIs(bf_a.edits, edits_a)
+                    for edits in (edits_b, None):
+                        with pool.open(filepath, edits=edits) as bf:
+                            self.assertIsNot(bf, bf_a)
+                            self.assertIs(bf.edits, edits)
+                        self.assertIsNone(bf.handle_mmap)
+                    self.assertIs(bf_a.edits, edits_a)
+                self.assertIsNone(bf_a.edits)
+                self.assertEqual([item[0] for item in pool.files.values()], [bf_a])
+
+                # changes on disk are detected
+                st = os.stat(filepath)
+                os.utime(filepath, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000000))
+                with pool.open(filepath) as bf:
+                    self.assertIsNot(bf, bf_prev)
+
+            self.assertEqual(len(pool.files), 0)
+
+    def test_visit_breadth_first(self):
+        from bam.blend import blendfile_path_walker
+
+        def visit_paths(filepath, blendfile_level_cb):
+            return {
+                (fp.basedir, fp_blend_basename, fp.filepath)
+                for fp, (rootdir, fp_blend_basename) in blendfile_path_walker.FilePath.visit_from_blend(
+                        filepath,
+                        recursive=True,
+                        blendfile_level_cb=blendfile_level_cb,
+                        )
+                }
+
+        def level_cb(filepath):
+            pass
+
+        for filepath in iter_blends():
+            # level callbacks visit depth first
+            self.assertEqual(visit_paths(filepath, (level_cb, level_cb)), visit_paths(filepath, (None, None)))
+
+    def test_visit_parallel(self):
+        from bam.blend import blendfile_path_walker
+
+        def visit_paths(fp_iter):
+            return {
+                (fp.userdata[0].code, fp.basedir, fp_blend_basename, fp.level,
+                 fp.filepath, fp.filepath_absolute, tuple(fp.files_siblings()))
+                for fp, (rootdir, fp_blend_basename) in fp_iter
+                }
+
+        for filepath in iter_blends():
+            self.assertEqual(
+                    visit_paths(blendfile_path_walker.FilePath.visit_from_blend(filepath, recursive=True)),
+                    visit_paths(blendfile_path_walker.FilePath.visit_from_blend_parallel(filepath, recursive=True, jobs=2)),
+                    )
+
+    def test_iter_ListBase(self):
+        from bam.blend import blendfile
+        from bam.blend.blendfile_path_walker import bf_utils
+
+        def iter_ListBase_expect(block):
+            while block:
+                yield block
+                block = block.file.find_block_from_offset(block[b'next'])
+
+        for use_mmap in (False, True):
+            for filepath in iter_blends():
+                with blendfile.open_blend(filepath, use_mmap=use_mmap) as bf:
+                    sdna_index_Base = bf.sdna_index_from_id[b'Base']
+                    for block in bf.find_blocks_from_code(b'SC'):
+                        for path in ((b'base', b'first'), (b'markers', b'first')):
+                            block_first = block.get_pointer(path)
+                            self.assertEqual(list(iter_ListBase_expect(block_first)),
+                                             list(bf_utils.iter_ListBase(block_first)))
+                        block_first = block.get_pointer((b'base', b'first'))
+                        self.assertEqual(
+                                [item.get_pointer(b'object', sdna_index_refine=sdna_index_Base)
+                                 for item in iter_ListBase_expect(block_first)],
+                                list(bf_utils.iter_ListBase_pointer(
+                                        block_first, b'object', sdna_index_refine=sdna_index_Base)),
+                                )
+                    offsets = [block.addr_old for block in bf.blocks] + [0, 1]
+                    self.assertEqual([bf.find_block_from_offset(offset) for offset in offsets],
+                                     bf.find_blocks_from_offsets(offsets))
+
+    def test_pointer_graph(self):
+        from bam.blend import blendfile
+        from bam.blend.blendfile_path_walker import ExpandID
+
+        for filepath in iter_blends():
+            with blendfile.open_blend(filepath, codes={b'SC'}) as bf:
+                graph = bf.pointer_graph()
+                self.assertEqual(len(graph), len(bf.blocks))
+                for code in ExpandID.expand_funcs.keys():
+                    for block in bf.find_blocks_from_code(code):
+                        reachable = graph.reachable([block])
+                        self.assertIn(block, reachable)
+                        # ID's used by the block are found from its pointers
+                        for sub_block in ExpandID.expand(block):
+                            self.assertIn(sub_block, reachable)
+                        # the next ID of the same type isn't
+                        block_next = bf.find_block_from_offset(block[b'id', b'next'])
+                        if block_next is not None:
+                            self.assertNotIn(block_next, [bf.blocks[i] for i in graph.targets(
+                                    bf.block_from_offset[block.addr_old])])
+
+    def test_visit_path_codes(self):
+        from bam.blend import blendfile_path_walker
+
+        def visit_paths(filepath, path_codes):
+            return {
+                (fp.userdata[0].code, fp.basedir, fp.level, fp.filepath, fp.filepath_absolute)
+                for fp, (rootdir, fp_blend_basename) in blendfile_path_walker.FilePath.visit_from_blend(
+                        filepath, recursive=True, path_codes=path_codes)
+                }
+
+        for filepath in iter_blends():
+            expect = visit_paths(filepath, None)
+            for path_codes in ({b'IM'}, {b'LI'}, {b'CF'}, {b'IM', b'LI'}):
+                self.assertEqual(
+                        {item for item in expect if item[0] in path_codes},
+                        visit_paths(filepath, path_codes),
+                        )
+
+    def test_expand_cache(self):
+        from bam.blend import blendfile
+        from bam.blend import blendfile_path_walker
+        ExpandID = blendfile_path_walker.ExpandID
+
+        for filepath in iter_blends():
+            with blendfile.open_blend(filepath) as bf:
+                for code, fn in ExpandID.expand_funcs.items():
+                    for block in bf.find_blocks_from_code(code):
+                        sub_blocks = ExpandID.expand(block)
+                        self.assertEqual(list(sub_blocks), [sub_block for sub_block in fn(block) if sub_block is not None])
+                        # each ID is only expanded once
+                        self.assertIs(sub_blocks, ExpandID.expand(block))
+                        if code not in ExpandID.expand_codes_any:
+                            self.assertLessEqual(
+                                    {sub_block.code for sub_block in sub_blocks},
+                                    ExpandID.expand_codes[code] | {b'ID'},
+                                    )
+
+    def test_visit_cache(self):
+        import shutil
+        import tempfile
+        from bam.blend import blendfile
+        from bam.blend import blendfile_path_walker
+
+        def visit_paths(filepath, cache, pool):
+            return [
+                (fp.userdata[0].code, fp.basedir, fp_blend_basename, fp.level,
+                 fp.filepath, fp.filepath_absolute, tuple(fp.files_siblings()))
+                for fp, (rootdir, fp_blend_basename) in blendfile_path_walker.FilePath.visit_from_blend(
+                        filepath, recursive=True, cache=cache, pool=pool)
+                ]
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with blendfile_path_walker.FilePathCache.from_basedir(temp_dir) as cache:
+                for filepath in iter_blends():
+                    with blendfile.BlendFilePool() as pool:
+                        expect = visit_paths(filepath, None, pool)
+                    with blendfile.BlendFilePool() as pool:
+                        self.assertEqual(expect, visit_paths(filepath, cache, pool))
+                    # replayed, without opening any files
+                    with blendfile.BlendFilePool() as pool:
+                        self.assertEqual(expect, visit_paths(filepath, cache, pool))
+                        self.assertEqual(len(pool.files), 0)
+
+                # entries which can't be decoded are ignored (the file is read)
+                with cache.db:
+                    cache.db.execute("UPDATE visit SET data=?", (b"\x80\x04K\x01.",))
+                with blendfile.BlendFilePool() as pool:
+                    self.assertEqual(expect, visit_paths(filepath, cache, pool))
+                    self.assertNotEqual(len(pool.files), 0)
+
+                # changing the file invalidates its entry
+                filepath_temp = os.path.join(os.fsencode(temp_dir), b"test.blend")
+                shutil.copy(filepath, filepath_temp)
+                with blendfile.BlendFilePool() as pool:
+                    expect = visit_paths(filepath_temp, cache, pool)
+                st = os.stat(filepath_temp)
+                os.utime(filepath_temp, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000000))
+                with blendfile.BlendFilePool() as pool:
+                    self.assertEqual(expect, visit_paths(filepath_temp, cache, pool))
+                    self.assertNotEqual(len(pool.files), 0)
+
+    def test_rdeps_index(self):
+        from bam.blend import blendfile_path_index
+
+        filepath_tex = os.path.join(BLENDS_DIR, "multi_level_link", "level1_lib", "level2_lib", "texture.png")
+        filepath_lib = os.path.join(BLENDS_DIR, "multi_level_link", "level1_lib", "level1_lib.blend")
+        filepath_blend = os.path.join(BLENDS_DIR, "multi_level_link", "level1", "level2", "level3", "level3.blend")
+
+        with blendfile_path_index.FilePathIndex(":memory:") as index:
+            self.assertEqual(index.update(BLENDS_DIR.encode('utf-8')), len(list(iter_blends())))
+            # unchanged files aren't read again
+            self.assertEqual(index.update(BLENDS_DIR.encode('utf-8')), 0)
+
+            self.assertEqual(
+                    [(blend, level) for blend, f_ref, code, level in index.rdeps(filepath_tex.encode('utf-8'))],
+                    [(filepath_lib.encode('utf-8'), 1), (filepath_blend.encode('utf-8'), 2)],
+                    )
+            self.assertEqual(
+                    [(blend, level) for blend, f_ref, code, level in index.rdeps(
+                            filepath_tex.encode('utf-8'), recursive=False)],
+                    [(filepath_lib.encode('utf-8'), 1)],
+                    )
+
+    def test_rdeps_index_remove(self):
+        import shutil
+        import tempfile
+        from bam.blend import blendfile_path_index
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = temp_dir.encode('utf-8')
+            shutil.copy(os.path.join(BLENDS_DIR, "variations", "cone.blend").encode('utf-8'), temp_dir)
+            for filename in (b"lib_user.blend", b"lib_user_link.blend"):
+                shutil.copy(os.path.join(BLENDS_DIR, "variations", "lib_user.blend").encode('utf-8'),
+                            os.path.join(temp_dir, filename))
+            filepath_lib = os.path.join(temp_dir, b"cone.blend")
+
+            def rdeps_blends():
+                return [os.path.basename(blend) for blend, f_ref, code, level in index.rdeps(filepath_lib)]
+
+            with blendfile_path_index.FilePathIndex(":memory:") as index:
+                self.assertEqual(index.update(temp_dir), 3)
+                self.assertEqual(rdeps_blends(), [b"lib_user.blend", b"lib_user_link.blend"])
+
+                # deleted
+                os.remove(os.path.join(temp_dir, b"lib_user.blend"))
+                # still listed, but can't be accessed
+                filepath_link = os.path.join(temp_dir, b"lib_user_link.blend")
+                os.remove(filepath_link)
+                os.symlink(os.path.join(temp_dir, b"missing.blend"), filepath_link)
+
+                self.assertEqual(index.update(temp_dir), 0)
+                self.assertEqual(rdeps_blends(), [])
+
+    def test_edits(self):
+        import io
+        import random
+        import shutil
+        import tempfile
+        from bam.blend import blendfile
+
+        # overlapping & touching writes
+        rng = random.Random(0)
+        data = bytes(rng.randrange(256) for _ in range(256))
+        expect = bytearray(data)
+        edits = blendfile.BlendFileEdits()
+        for _ in range(200):
+            offset = rng.randrange(250)
+            data_edit = bytes(rng.randrange(256) for _ in range(rng.randrange(1, 6)))
+            expect[offset:offset + len(data_edit)] = data_edit
+            edits.add(offset, data_edit)
+        self.assertEqual(bytes(expect), b''.join(edits.apply(i, data[i:i + 7]) for i in range(0, 256, 7)))
+        self.assertEqual(sorted(edits.offsets), edits.offsets)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filepath = os.path.join(temp_dir.encode('utf-8'), b"test.blend")
+            shutil.copy(os.path.join(BLENDS_DIR, "variations", "lib_user.blend").encode('utf-8'), filepath)
+            with open(filepath, 'rb') as f:
+                data = f.read()
+
+            # write to a copy, to compare
+            filepath_copy = filepath + b"_copy"
+            shutil.copy(filepath, filepath_copy)
+            with blendfile.open_blend(filepath_copy, "r+b") as bf:
+                for block in bf.find_blocks_from_code(b'LI'):
+                    block[b'name'] = b'//edited.blend'
+            with open(filepath_copy, 'rb') as f:
+                expect = f.read()
+
+            edits = blendfile.BlendFileEdits()
+            with blendfile.BlendFilePool() as pool:
+                with pool.open(filepath, edits=edits) as bf:
+                    for block in bf.find_blocks_from_code(b'LI'):
+                        block[b'name'] = b'//edited.blend'
+                        self.assertEqual(block[b'name'], b'//edited.blend')
+                        self.assertEqual(block.get_raw_data(), expect[block.file_offset:block.file_offset + block.size])
+                self.assertIsNone(bf.edits)
+
+            self.assertNotEqual(len(edits), 0)
+            with open(filepath, 'rb') as f:
+                self.assertEqual(data, f.read())
+            handle_dst = io.BytesIO()
+            edits.copy_file(filepath, handle_dst)
+            self.assertEqual(expect, handle_dst.getvalue())
+
+    def test_pack(self):
+        import tempfile
+        import zipfile
+        from bam.blend import blendfile_pack
+        from bam.utils.system import uuid_from_file, UUIDWriter
+
+        filepath = os.path.join(
+                BLENDS_DIR, "multi_level_link", "level1", "level2", "level3", "level3.blend").encode('utf-8')
+
+        def uuid_from_data(data):
+            handle_uuid = UUIDWriter()
+            handle_uuid.write(data)
+            return handle_uuid.uuid()
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for mode in ('FILE', 'ZIP'):
+                dirpath = os.path.join(temp_dir.encode('utf-8'), mode.encode('ascii'))
+                os.mkdir(dirpath)
+                filepath_dst = os.path.join(dirpath, b"pack.zip" if mode == 'ZIP' else b"pack.blend")
+                paths_uuid = {}
+                for msg in blendfile_pack.pack(filepath, filepath_dst, mode=mode, paths_uuid=paths_uuid):
+                    pass
+
+                # blend files are written directly (no temp files left)
+                self.assertEqual(os.listdir(dirpath) == [b"pack.zip"], mode == 'ZIP')
+                if mode == 'ZIP':
+                    with zipfile.ZipFile(filepath_dst.decode('utf-8')) as zip_handle:
+                        files_uuid = {
+                            name: uuid_from_data(zip_handle.read(name))
+                            for name in zip_handle.namelist()
+                            }
+                    self.assertIn("__/__/__/level1_lib/level1_lib.blend", files_uuid)
+
+                    # compressing in parallel gives the same archive
+                    filepath_dst_jobs = os.path.join(temp_dir.encode('utf-8'), b"pack_jobs.zip")
+                    for msg in blendfile_pack.pack(filepath, filepath_dst_jobs, mode=mode, jobs=2):
+                        pass
+                    with open(filepath_dst, 'rb') as f_a, open(filepath_dst_jobs, 'rb') as f_b:
+                        self.assertEqual(f_a.read(), f_b.read())
+                else:
+                    files_uuid = {"level3.blend": uuid_from_file(filepath_dst)}
+                    for dirpath_iter, dirnames, filenames in os.walk(os.path.join(dirpath, b"__")):
+                        for filename in filenames:
+                            filepath_iter = os.path.join(dirpath_iter, filename)
+                            files_uuid[os.path.relpath(filepath_iter, dirpath).decode('utf-8')] = (
+                                    uuid_from_file(filepath_iter))
+                self.assertEqual(files_uuid, paths_uuid)
+
+    def test_zip_writer(self):
+        import io
+        import random
+        import zipfile
+        from unittest import mock
+        from bam.utils import zip_writer
+
+        rng = random.Random(0)
+        members = [
+            ("random_%d" % i, bytes(rng.randrange(256) for _ in range(rng.randrange(200000))))
+            for i in range(4)
+            ] + [("text_%d" % i, b"0123456789" * rng.randrange(20000)) for i in range(4)]
+
+        def zip_members(jobs):
+            handle = io.BytesIO()
+            with zipfile.ZipFile(handle, 'w', zipfile.ZIP_DEFLATED) as zip_handle:
+                with zip_writer.ZipWriter(zip_handle, jobs=jobs) as writer:
+                    self.assertLessEqual(writer.spool_size * writer.jobs * 2, zip_writer.SPOOL_MEMORY_MAX)
+                    for name, data in members:
+                        writer.write_from(zipfile.ZipInfo(name), lambda handle, data=data: handle.write(data))
+            with zipfile.ZipFile(handle) as zip_handle:
+                self.assertIsNone(zip_handle.testzip())
+                return [(name, zip_handle.read(name)) for name in zip_handle.namelist()]
+
+        for jobs in (1, 3, 1000):
+            self.assertEqual(zip_members(jobs), members)
+        # pending members written to temp files
+        with mock.patch.object(zip_writer, "SPOOL_MEMORY_MAX", 1024):
+            self.assertEqual(zip_members(3), members)
+        # without the zipfile internals used to add compressed members
+        with mock.patch.object(zip_writer, "_ZIPFILE_ATTRS", ("__missing__",)):
+            self.assertEqual(zip_members(3), members)
+
+    def test_is_compressed_file(self):
+        import random
+        import tempfile
+        from bam.utils.system import is_compressed_file
+
+        rng = random.Random(0)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filepath = os.path.join(temp_dir, "test.exr")
+            for i, (data, expect) in enumerate((
+                    (bytes(rng.randrange(256) for _ in range(300000)), True),
+                    (b"0123456789" * 30000, False),
+                    # the extension isn't used, only the contents
+                    (b"", False),
+                    # known compressed formats aren't sampled
+                    (b"\x1f\x8b" + b"0123456789" * 30000, True),
+                    )):
+                with open(filepath, 'wb') as f:
+                    f.write(data)
+                # ensure the cache doesn't use the previous result
+                os.utime(filepath, ns=(0, i * 1000000000))
+                self.assertEqual(is_compressed_file(filepath), expect)
+
+        # compressed blend files use gzip
+        for filepath in iter_blends():
+            with open(filepath, 'rb') as f:
+                is_gzip = (f.read(2) == b'\x1f\x8b')
+            self.assertEqual(is_compressed_file(filepath), is_gzip)
+
+    def test_copy_files(self):
+        import tempfile
+        from unittest import mock
+        from bam.utils import file_copy
+
+        paths_src = list(iter_blends())
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for jobs in (1, 3):
+                paths_src_dst = [
+                    (path_src, os.path.join(temp_dir.encode('utf-8'), b"%d_%d.blend" % (jobs, i)))
+                    for i, path_src in enumerate(paths_src)
+                    ]
+                result = list(file_copy.copy_files(paths_src_dst, jobs=jobs))
+                # results are in order
+                self.assertEqual([item[:2] for item in result], paths_src_dst)
+                for path_src, path_dst, size, time_copy, method in result:
+                    self.assertIn(method, {'reflink', 'copy_file_range', 'buffered'})
+                    self.assertEqual(size, os.path.getsize(path_src))
+                    with open(path_src, 'rb') as f_src, open(path_dst, 'rb') as f_dst:
+                        self.assertEqual(f_src.read(), f_dst.read())
+
+            # without kernel support
+            path_src, path_dst = paths_src[0], os.path.join(temp_dir.encode('utf-8'), b"buffered.blend")
+            with mock.patch.object(file_copy.sys, "platform", "unknown"):
+                self.assertEqual(file_copy.copy_file(path_src, path_dst), 'buffered')
+            with open(path_src, 'rb') as f_src, open(path_dst, 'rb') as f_dst:
+                self.assertEqual(f_src.read(), f_dst.read())
+
+    def test_gzip_stream(self):
+        import gzip
+        import shutil
+        import tempfile
+        from bam.blend import blendfile
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for filepath in iter_blends():
+                with open(filepath, 'rb') as f:
+                    if f.read(2) != b'\x1f\x8b':
+                        continue
+                filepath_temp = os.path.join(temp_dir, "decompressed.blend")
+                with gzip.open(filepath, 'rb') as f_src, open(filepath_temp, 'wb') as f_dst:
+                    shutil.copyfileobj(f_src, f_dst)
+
+                with blendfile.open_blend(filepath_temp) as bf:
+                    expect = blend_id_items(bf)
+                    expect_data = [bytes(block.get_raw_data()) for block in bf.blocks]
+                with blendfile.open_blend(filepath) as bf:
+                    self.assertIs(type(bf.handle), blendfile.BlendFileStream)
+                    self.assertEqual(expect, blend_id_items(bf))
+                    self.assertEqual(expect_data, [bytes(block.get_raw_data()) for block in bf.blocks])
+
+                # only keep a single chunk, reading backwards restarts decompression
+                stream = blendfile.BlendFileStream(gzip.open(filepath, 'rb'), cache_size=blendfile.STREAM_CHUNK_SIZE)
+                with blendfile.BlendFile(stream) as bf:
+                    self.assertEqual(
+                            expect_data[::-1],
+                            [bytes(block.get_raw_data()) for block in reversed(bf.blocks)],
+                            )
+                    self.assertEqual(len(stream.chunks), 1)
+
+    def test_gzip_stream_rewind(self):
+        import gzip
+        from bam.blend import blendfile
+        from bam.blend import blendfile_path_walker
+
+        for filepath in iter_blends():
+            with open(filepath, 'rb') as f:
+                if f.read(2) != b'\x1f\x8b':
+                    continue
+
+            # a full path walk reads the file once
+            with blendfile.BlendFilePool() as pool:
+                list(blendfile_path_walker.FilePath.visit_from_blend(filepath, recursive=True, pool=pool))
+                streams = [
+                    item[0].handle for item in pool.files.values()
+                    if type(item[0].handle) is blendfile.BlendFileStream
+                    ]
+                self.assertNotEqual(streams, [])
+                for stream in streams:
+                    self.assertEqual(stream.rewind_count, 0)
+
+            # reading in file order restarts decompression once (after scanning), whatever the cache size
+            stream = blendfile.BlendFileStream(gzip.open(filepath, 'rb'), cache_size=blendfile.STREAM_CHUNK_SIZE)
+            with blendfile.BlendFile(stream) as bf:
+                for block in sorted(bf.blocks, key=lambda block: block.file_offset):
+                    block.get_raw_data()
+                self.assertLessEqual(stream.rewind_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1791,6 +1791,90 @@ class BamDepsTest(unittest.TestCase):
             'OK'
         ]], output)
 
+    @unittest.mock.patch('bam.cli.print')
+    def test_deps_cache_readonly(self, mock_print):
+        import stat
+        import tempfile
+        from bam.cli import bam_commands
+
+        printed = []
+
+        def record_print(*stuff, sep=' ', end='\n'):
+            printed.append(sep.join(stuff) + end)
+
+        mock_print.side_effect = record_print
+
+        blendpath_src = Path(__file__).absolute().parent / 'blends' / 'cube-rotating.blend'
+        with tempfile.TemporaryDirectory() as temp_dir:
+            blendpath = Path(temp_dir) / blendpath_src.name
+            shutil.copy(str(blendpath_src), str(blendpath))
+            shutil.copy(str(blendpath_src.with_name('cube-rotating.abc')), temp_dir)
+
+            # a project '.bam' directory which can't be written,
+            # (the database path is a directory so it can't be opened when running as root too).
+            basedir = Path(temp_dir) / '.bam'
+            (basedir / 'deps_cache.db').mkdir(parents=True)
+            basedir.chmod(stat.S_IRUSR | stat.S_IXUSR)
+            try:
+                bam_commands.deps([str(blendpath)], recursive=False, use_json=True)
+            finally:
+                basedir.chmod(stat.S_IRWXU)
+
+            output = json.loads(''.join(printed))
+            self.assertEqual([[
+                str(blendpath),
+                '//cube-rotating.abc',
+                str(blendpath.with_name('cube-rotating.abc')),
+                'OK'
+            ]], output)
+
+
+class BamRdepsTest(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        self.temp_dir = tempfile.TemporaryDirectory()
+        blends_dir = Path(__file__).absolute().parent / 'blends' / 'variations'
+        self.dirpath = Path(self.temp_dir.name) / 'blends'
+        self.dirpath.mkdir()
+        for filename in ('cone.blend', 'lib_user.blend'):
+            shutil.copy(str(blends_dir / filename), str(self.dirpath))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def rdeps(self, dirs=None):
+        from bam.cli import bam_commands
+
+        printed = []
+
+        def record_print(*stuff, sep=' ', end='\n'):
+            printed.append(sep.join(stuff) + end)
+
+        with unittest.mock.patch('bam.cli.print', side_effect=record_print):
+            bam_commands.rdeps([str(self.dirpath / 'cone.blend')], use_json=True, dirs=dirs)
+        return [item[1] for item in json.loads(''.join(printed))]
+
+    def test_rdeps_readonly(self):
+        import stat
+
+        # a project '.bam' directory which can't be written,
+        # (the database path is a directory so it can't be opened when running as root too).
+        basedir = Path(self.temp_dir.name) / '.bam'
+        (basedir / 'deps_index.db').mkdir(parents=True)
+        basedir.chmod(stat.S_IRUSR | stat.S_IXUSR)
+        try:
+            with CHDir(self.temp_dir.name):
+                self.assertEqual(self.rdeps(), [str(self.dirpath / 'lib_user.blend')])
+        finally:
+            basedir.chmod(stat.S_IRWXU)
+
+    def test_rdeps_outside_project(self):
+        with CHDir(self.temp_dir.name):
+            # only directories passed in are searched
+            with self.assertRaises(RuntimeError):
+                self.rdeps()
+            self.assertEqual(self.rdeps(dirs=[str(self.dirpath)]), [str(self.dirpath / 'lib_user.blend')])
+
 
 if __name__ == '__main__':
     data = global_setup()